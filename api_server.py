@@ -4,8 +4,10 @@ FastAPI backend for financial statement analysis
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from pydantic import BaseModel
+import asyncio
+import contextlib
 import os
 import tempfile
 from pathlib import Path
@@ -17,7 +19,7 @@ import uuid
 
 from src.parsers.enhanced_parser import EnhancedDocumentParser
 from src.analyzers.financial_analyzer import FinancialAnalyzer
-from src.llm.financial_llm import FinancialLLM
+from src.llm.financial_llm import FinancialLLM, EXTRACTION_CHAR_LIMIT
 from src.utils import (
     PeerBenchmark,
     extract_from_structured_data,
@@ -112,6 +114,65 @@ except Exception as e:
     llm = None
 
 
+async def _parse_pdf_and_extract(
+    file_path: str,
+    period_hint: str,
+    filename: str,
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Parse a PDF in a worker thread and start LLM structured extraction as soon
+    as the first pages cover the extraction excerpt, overlapping parse and I/O.
+    """
+    if not llm:
+        return await asyncio.to_thread(parser.parse_document, file_path), {}
+
+    loop = asyncio.get_running_loop()
+    pages_queue: asyncio.Queue = asyncio.Queue()
+
+    def produce() -> Dict[str, Any]:
+        parsed = False
+        try:
+            result = parser.parse_document(
+                file_path,
+                on_page=lambda text: loop.call_soon_threadsafe(pages_queue.put_nowait, text),
+            )
+            parsed = True
+            return result
+        finally:
+            # None ends the page stream; False tells the consumer the parse failed
+            loop.call_soon_threadsafe(pages_queue.put_nowait, None if parsed else False)
+
+    async def consume() -> Dict[str, Any]:
+        excerpt_pages: List[str] = []
+        used = 0
+        while used < EXTRACTION_CHAR_LIMIT:
+            text = await pages_queue.get()
+            if text is False:
+                return {}
+            if text is None:
+                break
+            excerpt_pages.append(text or '')
+            used += len(text or '') + 1
+        if not ''.join(excerpt_pages).strip():
+            return {}
+        try:
+            return await llm.aextract_structured_data(excerpt_pages, period_hint=period_hint)
+        except Exception as exc:
+            print(f"Warning: structured extraction failed for {filename}: {exc}")
+            return {}
+
+    extraction = asyncio.create_task(consume())
+    try:
+        parsed_doc = await asyncio.to_thread(produce)
+    except BaseException:
+        # Don't leave an extraction running for a document that failed to parse
+        extraction.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await extraction
+        raise
+    return parsed_doc, await extraction
+
+
 class ChatRequest(BaseModel):
     user_id: str
     question: str
@@ -216,31 +277,31 @@ async def analyze_files(
                 content = await file.read()
                 f.write(content)
             
-            parsed_doc = parser.parse_document(file_path)
             period_label = Path(file.filename).stem
             llm_metadata: Dict[str, Any] = {}
             llm_notes: List[str] = []
+            structured: Dict[str, Any] = {}
+            
+            if Path(file_path).suffix.lower() == '.pdf':
+                parsed_doc, structured = await _parse_pdf_and_extract(file_path, period_label, file.filename)
+            else:
+                parsed_doc = parser.parse_document(file_path)
             
             if parsed_doc['type'] == 'pdf':
-                all_text = '\n'.join([page['text'] for page in parsed_doc['content']])
+                all_text = '\n'.join(page['text'] for page in parsed_doc['content'])
                 financial_data = analyzer.extract_financial_data(all_text)
-                if llm and all_text.strip():
-                    try:
-                        structured = llm.extract_structured_data(all_text, period_hint=period_label)
-                        if structured:
-                            financial_data, llm_metadata, llm_notes = merge_llm_structured_data(
-                                financial_data,
-                                structured,
-                            )
-                    except Exception as exc:
-                        print(f"Warning: structured extraction failed for {file.filename}: {exc}")
+                if structured:
+                    financial_data, llm_metadata, llm_notes = merge_llm_structured_data(
+                        financial_data,
+                        structured,
+                    )
             elif parsed_doc['type'] in ['excel', 'csv']:
                 financial_data = extract_from_structured_data(parsed_doc)
             elif parsed_doc['type'] == 'xbrl':
                 financial_data = extract_from_xbrl(parsed_doc)
             elif parsed_doc['type'] == 'image' and llm:
                 try:
-                    analysis = llm.analyze_document_with_vision(parsed_doc['base64'])
+                    analysis = await llm.aanalyze_document_with_vision(parsed_doc['base64'])
                     financial_data = {'llm_extraction': analysis}
                 except NotImplementedError:
                     financial_data = {}
@@ -259,7 +320,7 @@ async def analyze_files(
             
             insights = None
             if llm and financial_data:
-                insights = llm.generate_financial_insights(financial_data, ratios, risks)
+                insights = await llm.agenerate_financial_insights(financial_data, ratios, risks)
             
             results.append({
                 'filename': file.filename,
@@ -342,7 +403,7 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=404, detail="User not found")
 
     try:
-        answer = llm.answer_question(request.question, request.context, user_id=request.user_id)
+        answer = await llm.aanswer_question(request.question, request.context, user_id=request.user_id)
         entry = _append_chat_history(request.user_id, request.question, answer)
         return {"answer": answer, "entry": entry}
     except Exception as e:
@@ -134,9 +134,8 @@ else:
             
             # Get assistant response
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    response = st.session_state.chatbot.ask_question(prompt)
-                    st.markdown(response)
+                # Render the answer as it is generated instead of after it completes
+                response = st.write_stream(st.session_state.chatbot.ask_question_stream(prompt))
             
             # Add assistant response to chat
             st.session_state.messages.append({"role": "assistant", "content": response})
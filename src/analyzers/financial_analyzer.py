@@ -3,9 +3,209 @@ Financial analyzer module for calculating key financial indicators,
 identifying trends, and assessing risks
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+import math
 import re
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Numbers with optional thousands separators and decimals. \d stays Unicode-aware
+# so full-width digits in Chinese statements are still picked up.
+_NUMBER_RE = re.compile(r'\d+(?:,\d{3})*(?:\.\d+)?')
+
+# Column order of the ratio kernel input; revenue and cash already include
+# the sales / cash_equivalents fallbacks used by calculate_ratios
+_RATIO_INPUTS = (
+    'revenue',
+    'net_income',
+    'total_assets',
+    'total_liabilities',
+    'equity',
+    'current_assets',
+    'current_liabilities',
+    'cash',
+    'inventory',
+    'accounts_receivable',
+    'operating_cash_flow',
+    'interest_expense',
+    'gross_profit',
+    'operating_income',
+    'free_cash_flow',
+)
+
+# Column order of the ratio kernel output, matching calculate_ratios key order
+_RATIO_KEYS = (
+    'profit_margin',
+    'gross_margin',
+    'operating_margin',
+    'roa',
+    'roe',
+    'current_ratio',
+    'quick_ratio',
+    'cash_ratio',
+    'debt_to_asset_ratio',
+    'equity_multiplier',
+    'debt_to_equity_ratio',
+    'interest_coverage',
+    'asset_turnover',
+    'inventory_turnover',
+    'cash_flow_to_revenue',
+    'free_cash_flow_margin',
+)
+
+
+def _nz(value):
+    # Mirrors the truthiness checks in calculate_ratios, with NaN as missing
+    return value == value and value != 0
+
+
+def _ratio_kernel(inputs, out):
+    """
+    Compute calculate_ratios over a 2-D float array, one company per row
+    
+    Missing inputs are NaN. Ratios that calculate_ratios would omit are left as
+    NaN in ``out``, which must be shaped (len(inputs), len(_RATIO_KEYS)).
+    """
+    for i in range(inputs.shape[0]):
+        revenue = inputs[i, 0]
+        net_income = inputs[i, 1]
+        total_assets = inputs[i, 2]
+        total_liabilities = inputs[i, 3]
+        equity = inputs[i, 4]
+        current_assets = inputs[i, 5]
+        current_liabilities = inputs[i, 6]
+        cash = inputs[i, 7]
+        inventory = inputs[i, 8]
+        accounts_receivable = inputs[i, 9]
+        operating_cash_flow = inputs[i, 10]
+        interest_expense = inputs[i, 11]
+        gross_profit = inputs[i, 12]
+        operating_income = inputs[i, 13]
+        free_cash_flow = inputs[i, 14]
+        
+        out[i, :] = math.nan
+        
+        if revenue > 0:
+            if _nz(net_income):
+                out[i, 0] = (net_income / revenue) * 100
+            if _nz(gross_profit):
+                out[i, 1] = (gross_profit / revenue) * 100
+            if _nz(operating_income):
+                out[i, 2] = (operating_income / revenue) * 100
+            if _nz(operating_cash_flow):
+                out[i, 14] = (operating_cash_flow / revenue) * 100
+        if total_assets > 0:
+            if _nz(net_income):
+                out[i, 3] = (net_income / total_assets) * 100
+            if _nz(total_liabilities):
+                out[i, 8] = (total_liabilities / total_assets) * 100
+            if _nz(revenue):
+                out[i, 12] = revenue / total_assets
+        if equity > 0:
+            if _nz(net_income):
+                out[i, 4] = (net_income / equity) * 100
+            if _nz(total_assets):
+                out[i, 9] = total_assets / equity
+            if _nz(total_liabilities):
+                out[i, 10] = (total_liabilities / equity) * 100
+        if current_liabilities > 0:
+            if _nz(current_assets):
+                out[i, 5] = current_assets / current_liabilities
+                quick_assets = current_assets
+                if _nz(inventory):
+                    quick_assets = current_assets - inventory
+                elif _nz(accounts_receivable):
+                    quick_assets = current_assets - accounts_receivable
+                out[i, 6] = quick_assets / current_liabilities
+            if _nz(cash):
+                out[i, 7] = cash / current_liabilities
+        if interest_expense > 0:
+            if _nz(operating_income):
+                out[i, 11] = operating_income / interest_expense
+            elif _nz(net_income):
+                out[i, 11] = (net_income + interest_expense) / interest_expense
+        if inventory > 0 and _nz(revenue):
+            out[i, 13] = (revenue * 0.65) / inventory
+        if free_cash_flow == free_cash_flow:
+            out[i, 15] = free_cash_flow
+
+
+if NUMBA_AVAILABLE:
+    _nz = njit(cache=True)(_nz)
+    _ratio_kernel = njit(cache=True)(_ratio_kernel)
+
+
+def _ratio_inputs(financial_data: Dict[str, Any]) -> List[float]:
+    """Return one kernel input row for ``financial_data`` (NaN for missing values)"""
+    row = []
+    for key in _RATIO_INPUTS:
+        value = financial_data.get(key)
+        if key == 'revenue':
+            value = value or financial_data.get('sales')
+        elif key == 'cash':
+            value = value or financial_data.get('cash_equivalents')
+        row.append(math.nan if value is None else float(value))
+    return row
+
+
+def _ratios_from_row(row: Sequence[float]) -> Dict[str, float]:
+    """Turn one kernel output row back into a calculate_ratios-style dict"""
+    return {
+        key: float(value)
+        for key, value in zip(_RATIO_KEYS, row)
+        if value == value
+    }
+
+
+def _trend_columns(frame: 'pd.DataFrame') -> Tuple[List[Any], List[Any], List[Any], List[Any]]:
+    """
+    Pull period labels and revenue / net income / total asset series out of a
+    per-period DataFrame with column operations
+    
+    Missing and zero values follow the dict path: revenue falls back to sales,
+    and anything still missing counts as 0.
+    """
+    def column(name: str) -> 'pd.Series':
+        if name in frame.columns:
+            return pd.to_numeric(frame[name], errors='coerce')
+        return pd.Series(np.nan, index=frame.index)
+    
+    def present(series: 'pd.Series') -> 'pd.Series':
+        return series.notna() & (series != 0)
+    
+    if 'period' in frame.columns:
+        labels = frame['period'].tolist()
+    else:
+        labels = [None] * len(frame)
+    periods = [
+        label if isinstance(label, str) or not pd.isna(label) else f'Period {i+1}'
+        for i, label in enumerate(labels)
+    ]
+    
+    revenue = column('revenue')
+    revenue = revenue.where(present(revenue), column('sales'))
+    values = [
+        series.where(present(series), 0).tolist()
+        for series in (revenue, column('net_income'), column('total_assets'))
+    ]
+    return periods, values[0], values[1], values[2]
+
 
 class FinancialAnalyzer:
     """
@@ -215,12 +415,37 @@ class FinancialAnalyzer:
         
         return ratios
     
-    def identify_trends(self, historical_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def calculate_ratios_batch(self, financial_data_list: Sequence[Dict[str, Any]]) -> List[Dict[str, float]]:
+        """
+        Calculate ratios for several companies or periods at once
+        
+        With numba installed all rows go through the compiled ratio kernel in a
+        single call; otherwise each row is handled by calculate_ratios.
+        
+        Args:
+            financial_data_list: Financial metric dictionaries, one per company or period
+            
+        Returns:
+            Ratio dictionaries in the same order, identical to calculate_ratios output
+        """
+        if not NUMBA_AVAILABLE:
+            return [self.calculate_ratios(financial_data) for financial_data in financial_data_list]
+        
+        inputs = np.array(
+            [_ratio_inputs(financial_data) for financial_data in financial_data_list],
+            dtype=np.float64,
+        ).reshape(-1, len(_RATIO_INPUTS))
+        out = np.empty((inputs.shape[0], len(_RATIO_KEYS)))
+        _ratio_kernel(inputs, out)
+        return [_ratios_from_row(row) for row in out.tolist()]
+    
+    def identify_trends(self, historical_data: Union[List[Dict[str, Any]], 'pd.DataFrame']) -> Dict[str, Any]:
         """
         Identify trends from historical financial data
         
         Args:
-            historical_data: List of financial data dictionaries from multiple periods
+            historical_data: List of financial data dictionaries from multiple periods,
+                or a DataFrame with one row per period and one column per metric
             
         Returns:
             Dictionary with trend analysis including growth rates and period comparisons
@@ -243,22 +468,25 @@ class FinancialAnalyzer:
             return trends
         
         # 提取各期的关键指标
-        periods = []
-        revenues = []
-        profits = []
-        assets = []
-        
-        for i, period_data in enumerate(historical_data):
-            period_label = period_data.get('period', f'Period {i+1}')
-            periods.append(period_label)
-            
-            revenue = period_data.get('revenue') or period_data.get('sales')
-            net_income = period_data.get('net_income')
-            total_assets = period_data.get('total_assets')
+        if PANDAS_AVAILABLE and isinstance(historical_data, pd.DataFrame):
+            periods, revenues, profits, assets = _trend_columns(historical_data)
+        else:
+            periods = []
+            revenues = []
+            profits = []
+            assets = []
             
-            revenues.append(revenue if revenue else 0)
-            profits.append(net_income if net_income else 0)
-            assets.append(total_assets if total_assets else 0)
+            for i, period_data in enumerate(historical_data):
+                period_label = period_data.get('period', f'Period {i+1}')
+                periods.append(period_label)
+                
+                revenue = period_data.get('revenue') or period_data.get('sales')
+                net_income = period_data.get('net_income')
+                total_assets = period_data.get('total_assets')
+                
+                revenues.append(revenue if revenue else 0)
+                profits.append(net_income if net_income else 0)
+                assets.append(total_assets if total_assets else 0)
         
         trends['periods'] = periods
         trends['revenue_values'] = revenues
@@ -509,7 +737,4 @@ class FinancialAnalyzer:
     
     def _extract_numbers(self, text: str) -> List[float]:
         """Extract numeric values from text"""
-        import re
-        # Find numbers with optional commas and decimals
-        numbers = re.findall(r'\d+(?:,\d{3})*(?:\.\d+)?', text)
-        return [float(n.replace(',', '')) for n in numbers]
+        return [float(n.replace(',', '')) for n in _NUMBER_RE.findall(text)]
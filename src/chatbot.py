@@ -2,8 +2,9 @@
 Main chatbot application integrating all components
 """
 
+import io
 import os
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Iterator, Optional, Tuple
 from pathlib import Path
 
 from src.parsers import EnhancedDocumentParser
@@ -121,6 +122,26 @@ class FinancialChatbot:
         
         return self.llm.answer_question(question, self.analysis_results)
     
+    def ask_question_stream(self, question: str) -> Iterator[str]:
+        """
+        Answer a question about the analyzed financial statement, streaming the reply
+        
+        Args:
+            question: User's question
+            
+        Returns:
+            Iterator over chunks of the answer as they are generated
+        """
+        if not self.analysis_results:
+            yield "Please upload and analyze a financial statement first."
+            return
+        
+        if not self.llm:
+            yield "LLM features are not available. Please configure OpenAI API key."
+            return
+        
+        yield from self.llm.answer_question_stream(question, self.analysis_results)
+    
     def get_summary(self) -> str:
         """
         Get a summary of the current analysis
@@ -131,46 +152,50 @@ class FinancialChatbot:
         if not self.analysis_results:
             return "No document has been analyzed yet."
         
-        summary = "📊 Financial Statement Analysis Summary\n"
-        summary += "=" * 50 + "\n\n"
+        results = self.analysis_results
+        buf = io.StringIO()
+        buf.write("📊 Financial Statement Analysis Summary\n" + "=" * 50 + "\n\n")
         
         # Financial Data
-        if self.analysis_results.get('financial_data'):
-            summary += "💰 Key Financial Metrics:\n"
-            for key, value in self.analysis_results['financial_data'].items():
-                if value is not None:
-                    summary += f"  • {key.replace('_', ' ').title()}: {value:,.2f}\n" if isinstance(value, (int, float)) else f"  • {key.replace('_', ' ').title()}: {value}\n"
-            summary += "\n"
+        if results.get('financial_data'):
+            rows = ''.join(
+                f"  • {key.replace('_', ' ').title()}: {value:,.2f}\n" if isinstance(value, (int, float))
+                else f"  • {key.replace('_', ' ').title()}: {value}\n"
+                for key, value in results['financial_data'].items()
+                if value is not None
+            )
+            buf.write(f"💰 Key Financial Metrics:\n{rows}\n")
         
         # Ratios
-        if self.analysis_results.get('ratios'):
-            summary += "📈 Financial Ratios:\n"
-            for key, value in self.analysis_results['ratios'].items():
-                summary += f"  • {key.replace('_', ' ').title()}: {value:.2f}%\n"
-            summary += "\n"
+        if results.get('ratios'):
+            rows = ''.join(
+                f"  • {key.replace('_', ' ').title()}: {value:.2f}%\n"
+                for key, value in results['ratios'].items()
+            )
+            buf.write(f"📈 Financial Ratios:\n{rows}\n")
         
         # Risks
-        if self.analysis_results.get('risks'):
-            summary += "⚠️  Identified Risks:\n"
-            if not self.analysis_results['risks']:
-                summary += "  • No significant risks identified\n"
-            else:
-                for risk in self.analysis_results['risks']:
-                    summary += f"  • [{risk['severity']}] {risk['type']}: {risk['description']}\n"
-            summary += "\n"
+        if results.get('risks'):
+            rows = ''.join(
+                f"  • [{risk['severity']}] {risk['type']}: {risk['description']}\n"
+                for risk in results['risks']
+            )
+            buf.write(f"⚠️  Identified Risks:\n{rows}\n")
         
         # AI Insights
-        if self.analysis_results.get('insights'):
-            summary += "💡 AI-Generated Insights:\n"
-            summary += self.analysis_results['insights'] + "\n"
+        if results.get('insights'):
+            buf.write(f"💡 AI-Generated Insights:\n{results['insights']}\n")
         
         # Benchmark
-        if self.analysis_results.get('benchmark'):
-            summary += "\n🏁 Peer Benchmarking:\n"
-            summary += f"  • Industry: {self.analysis_results['benchmark'].get('industry')}\n"
-            summary += f"  • Summary: {self.analysis_results['benchmark'].get('summary', 'N/A')}\n"
+        benchmark = results.get('benchmark')
+        if benchmark:
+            buf.write(
+                f"\n🏁 Peer Benchmarking:\n"
+                f"  • Industry: {benchmark.get('industry')}\n"
+                f"  • Summary: {benchmark.get('summary', 'N/A')}\n"
+            )
         
-        return summary
+        return buf.getvalue()
     
     def analyze_trends(self, historical_files: list) -> Dict[str, Any]:
         """
@@ -218,7 +243,7 @@ class FinancialChatbot:
         financial_data: Dict[str, Any] = {}
         
         if doc_type == 'pdf':
-            all_text = '\n'.join([page.get('text', '') for page in parsed_doc.get('content', [])])
+            all_text = '\n'.join(page.get('text', '') for page in parsed_doc.get('content', []))
             financial_data = self.analyzer.extract_financial_data(all_text)
             if self.llm and all_text.strip():
                 try:
@@ -5,13 +5,35 @@ Alibaba Cloud's Tongyi Qianwen models.
 
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
+import itertools
 import json
+import logging
 import os
-from typing import Dict, Any, List, Optional
+import re
+import threading
+import time
+from collections import deque
+from typing import (
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+    Union,
+)
 import textwrap
 
 import requests
 
+from src.utils.cache import LRUCache
 from src.utils.data_extraction import FINANCIAL_FIELDS
 
 try:
@@ -21,9 +43,357 @@ try:
 except Exception:
     pass
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None  # type: ignore[assignment]
+
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_TONGYI_BASE_URL = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1"
 DEFAULT_TONGYI_MODEL = "qwen-plus"
+DEFAULT_TONGYI_RPM = 500
+DEFAULT_MAX_CONCURRENT_REQUESTS = 16
+DEFAULT_RESPONSE_CACHE_SIZE = 128
+
+# Character budget for the structured-extraction excerpt
+EXTRACTION_CHAR_LIMIT = 6000
+
+# Token budgets for the variable parts of each prompt, checked locally before
+# the request is sent so oversize prompts never reach the API
+CONTEXT_TOKEN_LIMIT = 4000
+EXTRACTION_TOKEN_LIMIT = 2000
+SUMMARY_TOKEN_LIMIT = 6000
+HISTORY_TOKEN_BUDGET = 2000
+
+# Messages kept per user; the token budget decides how many are actually sent
+HISTORY_MAX_MESSAGES = 64
+
+# Upper bound on characters per token used when reading just enough of a
+# document to fill a token budget; English text averages about four
+_MAX_CHARS_PER_TOKEN = 6
+
+TextSource = Union[str, Iterable[str]]
+T = TypeVar("T")
+
+
+def _json_dumps(payload: Any) -> bytes:
+    """Serialize a request payload to UTF-8 JSON bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode("utf-8")
+
+
+def _json_loads(payload: Any) -> Any:
+    """Parse JSON text or bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def _take_chars(chunks: TextSource, limit: int, separator: str = "\n") -> str:
+    """Return the first ``limit`` characters of ``separator.join(chunks)``.
+
+    Chunks (e.g. PDF pages) are consumed lazily and iteration stops once the
+    budget is reached, so the full document never has to be joined.
+    """
+    if isinstance(chunks, str):
+        return chunks[:limit]
+
+    parts: List[str] = []
+    used = 0
+    for index, chunk in enumerate(chunks):
+        if index:
+            parts.append(separator)
+            used += len(separator)
+        chunk = chunk or ""
+        parts.append(chunk)
+        used += len(chunk)
+        if used >= limit:
+            break
+    return "".join(parts)[:limit]
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoding() -> Any:
+    """Load the tiktoken encoding once; None when tiktoken or its BPE file is unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def _char_token_cost(char: str) -> float:
+    # Roughly four ASCII characters per token; CJK and other symbols about one each
+    return 0.25 if char.isascii() else 1.0
+
+
+def _count_tokens(text: str) -> int:
+    """Count (or, without tiktoken, conservatively estimate) the tokens in ``text``."""
+    encoding = _token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    ascii_chars = sum(1 for char in text if char.isascii())
+    return -(-ascii_chars // 4) + (len(text) - ascii_chars)
+
+
+def _fit_tokens(text: str, budget: int) -> str:
+    """Trim ``text`` so it fits in ``budget`` tokens."""
+    if budget <= 0:
+        return ""
+    encoding = _token_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        if len(tokens) <= budget:
+            return text
+        return encoding.decode(tokens[:budget])
+
+    # The estimate never exceeds one token per character
+    if len(text) <= budget:
+        return text
+    used = 0.0
+    for index, char in enumerate(text):
+        used += _char_token_cost(char)
+        if used > budget:
+            return text[:index]
+    return text
+
+
+def _take_tokens(chunks: TextSource, budget: int) -> str:
+    """Return the longest prefix of ``chunks`` (joined by newlines) that fits in ``budget`` tokens.
+
+    Only enough chunks to cover the budget are read, as with :func:`_take_chars`.
+    """
+    return _fit_tokens(_take_chars(chunks, budget * _MAX_CHARS_PER_TOKEN), budget)
+
+
+_SCHEMA_EXAMPLE = json.dumps(
+    {
+        "metadata": {
+            "entity": "ACME Corp",
+            "period_label": "FY2023",
+            "fiscal_year": "2023",
+            "currency": "USD",
+        },
+        "metrics": {
+            "revenue": 1250000000.0,
+            "sales": 1250000000.0,
+            "gross_profit": 520000000.0,
+            "operating_income": 210000000.0,
+            "net_income": 155000000.0,
+            "total_assets": 1800000000.0,
+            "current_assets": 620000000.0,
+            "total_liabilities": 950000000.0,
+            "current_liabilities": 420000000.0,
+            "equity": 850000000.0,
+            "cash": 120000000.0,
+            "operating_cash_flow": 240000000.0,
+            "investing_cash_flow": -80000000.0,
+            "financing_cash_flow": -60000000.0,
+            "free_cash_flow": 160000000.0,
+            "total_debt": 400000000.0,
+            "interest_expense": 12000000.0,
+        },
+        "notes": [
+            "Gross margin improved to 41% year over year.",
+            "Net debt declined by 5% due to debt repayment.",
+        ],
+    },
+    indent=2,
+)
+
+_SCHEMA_PARTIAL_EXAMPLE = json.dumps(
+    {
+        "metadata": {
+            "entity": "Beta Manufacturing",
+            "period_label": "Q2 2023",
+            "fiscal_year": "2023",
+            "currency": "USD",
+        },
+        "metrics": {
+            "revenue": 42000000.0,
+            "net_income": 3200000.0,
+            "total_assets": None,
+            "equity": None,
+            "operating_cash_flow": 5800000.0,
+            "investing_cash_flow": -1200000.0,
+            "free_cash_flow": 4600000.0,
+        },
+        "notes": [
+            "Management guidance points to stable demand for the remainder of FY2023."
+        ],
+    },
+    indent=2,
+)
+
+# Built once at import; only the excerpt and period hint change per call.
+_EXTRACT_SYSTEM_PROMPT = textwrap.dedent(
+    """
+    You are a forensic accountant extracting structured metrics from corporate filings. Always respond with
+    JSON that matches this schema (omit fields by setting them to null, never invent new keys):
+    {schema_example}
+
+    Partial responses are allowed when a figure is missing. Example:
+    {schema_partial_example}
+
+    Rules:
+    1. Return numbers as floats in USD with no units or thousands separators.
+    2. If a value is unknown, set it to null instead of guessing.
+    3. Use the notes array for any qualitative insights (max 3 short strings).
+    4. Keep output strictly in JSON—no commentary before or after the object.
+    """
+).strip().format(
+    schema_example=_SCHEMA_EXAMPLE,
+    schema_partial_example=_SCHEMA_PARTIAL_EXAMPLE,
+)
+
+_BATCH_QUESTIONS_TEMPLATE = textwrap.dedent(
+    """
+    Answer each of the following numbered questions using the financial context above.
+    Respond with a JSON object of the form {{"answers": [{{"q": "<question>", "a": "<answer>"}}]}},
+    keeping the answers in the same order as the questions.
+
+    {questions}
+    """
+).strip()
+
+# Fallback splitter for batched answers that come back as a numbered list
+_NUMBERED_ITEM_RE = re.compile(r"^\s*(\d+)[.)]\s*", re.MULTILINE)
+
+_EXTRACT_USER_TEMPLATE = textwrap.dedent(
+    """
+    Document excerpt:
+    {excerpt}
+
+    Period hint: {period_hint}
+    Extract the metrics above and output JSON that follows the schema exactly.
+    """
+).strip()
+
+
+class _History:
+    """Bounded per-user conversation log kept as parallel role/content/token deques."""
+
+    __slots__ = ("roles", "contents", "tokens")
+
+    def __init__(self, maxlen: int = HISTORY_MAX_MESSAGES) -> None:
+        self.roles: Deque[str] = deque(maxlen=maxlen)
+        self.contents: Deque[str] = deque(maxlen=maxlen)
+        self.tokens: Deque[int] = deque(maxlen=maxlen)
+
+    def append(self, role: str, content: str, tokens: int) -> None:
+        # All three deques share maxlen, so they evict the same oldest entry
+        self.roles.append(role)
+        self.contents.append(content)
+        self.tokens.append(tokens)
+
+    def window(self, budget: int) -> List[Dict[str, str]]:
+        """Return the newest messages whose token counts fit in ``budget``, oldest first."""
+        count = 0
+        used = 0
+        for tokens in reversed(self.tokens):
+            if used + tokens > budget:
+                break
+            used += tokens
+            count += 1
+        start = len(self.tokens) - count
+        # Start on a question so the model never sees an answer without it
+        if count and self.roles[start] == "assistant":
+            start += 1
+        return [
+            {"role": role, "content": content}
+            for role, content in itertools.islice(zip(self.roles, self.contents), start, None)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+
+class _TokenBucket:
+    """Thread-safe token bucket that keeps request volume under a per-minute cap."""
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.capacity = max(1, requests_per_minute)
+        self.fill_rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.fill_rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            self._sleep(wait)
+
+
+class _CircuitBreaker:
+    """Stops calling Tongyi for a while after repeated server-side failures."""
+
+    def __init__(
+        self,
+        fail_max: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Set while the single half-open probe request is in flight
+        self.half_open = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.half_open:
+                raise RuntimeError(
+                    "Tongyi service is failing repeatedly; waiting for a probe request to finish."
+                )
+            remaining = self.reset_timeout - (self._clock() - self.opened_at)
+            if remaining > 0:
+                raise RuntimeError(
+                    f"Tongyi service is failing repeatedly; skipping request for another {remaining:.0f}s."
+                )
+            # Half-open: let this one request through to probe the service and
+            # reject everyone else until it reports back
+            self.half_open = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.half_open = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.half_open or self.failures >= self.fail_max:
+                self.opened_at = self._clock()
+            self.half_open = False
 
 
 class TongyiClient:
@@ -35,6 +405,7 @@ class TongyiClient:
         base_url: Optional[str] = None,
         model: Optional[str] = None,
         timeout: int = 60,
+        requests_per_minute: Optional[int] = None,
     ) -> None:
         if not api_key:
             raise ValueError(
@@ -45,6 +416,10 @@ class TongyiClient:
         self.base_url = (base_url or DEFAULT_TONGYI_BASE_URL).rstrip("/")
         self.model = model or DEFAULT_TONGYI_MODEL
         self.timeout = timeout
+        self.rate_limiter = _TokenBucket(
+            requests_per_minute or int(os.getenv("TONGYI_RPM", DEFAULT_TONGYI_RPM))
+        )
+        self.circuit_breaker = _CircuitBreaker()
         self.session = requests.Session()
         self.session.headers.update(
             {
@@ -70,16 +445,75 @@ class TongyiClient:
         if response_format:
             payload["response_format"] = response_format
 
-        response = self.session.post(
-            f"{self.base_url}/chat/completions",
-            json=payload,
-            timeout=self.timeout,
-        )
-        if response.status_code >= 400:
-            raise RuntimeError(
-                f"Tongyi request failed ({response.status_code}): {response.text.strip()}"
+        response = self._post(payload)
+        return _json_loads(response.content)
+
+    def stream_chat_completion(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = 0.4,
+        max_tokens: int = 800,
+        model: Optional[str] = None,
+    ) -> Iterator[str]:
+        """Yield completion text as it arrives from a server-sent event stream."""
+
+        payload: Dict[str, Any] = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+        }
+        response = self._post(payload, stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                for choice in _json_loads(data).get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield content
+        finally:
+            response.close()
+
+    def _post(self, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        self.circuit_breaker.before_call()
+        # Every exit must report back, or a half-open probe would never finish
+        try:
+            self.rate_limiter.acquire()
+            response = self.session.post(
+                f"{self.base_url}/chat/completions",
+                data=_json_dumps(payload),
+                timeout=self.timeout,
+                stream=stream,
             )
-        return response.json()
+        except BaseException:
+            self.circuit_breaker.record_failure()
+            raise
+        # Throttling (429) is not a sign of recovery, so it counts against the breaker
+        if response.status_code >= 500 or response.status_code == 429:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        if response.status_code >= 400:
+            detail = response.text.strip()
+            # Release the (possibly streaming) connection back to the pool
+            response.close()
+            raise RuntimeError(f"Tongyi request failed ({response.status_code}): {detail}")
+        return response
+
+
+@functools.lru_cache(maxsize=8)
+def _shared_client(api_key: str, base_url: str, model: str) -> TongyiClient:
+    """Return a process-wide client per credential set so HTTP connections are reused.
+
+    ``requests.Session`` is thread-safe for this usage, and sharing the client
+    also shares its rate limiter and circuit breaker.
+    """
+    return TongyiClient(api_key=api_key, base_url=base_url, model=model)
 
 
 class FinancialLLM:
@@ -90,19 +524,22 @@ class FinancialLLM:
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model: Optional[str] = None,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+        response_cache_size: int = DEFAULT_RESPONSE_CACHE_SIZE,
     ) -> None:
         self.api_key = api_key or os.getenv("TONGYI_API_KEY") or os.getenv("DASHSCOPE_API_KEY")
         self.base_url = base_url or os.getenv("TONGYI_BASE_URL", DEFAULT_TONGYI_BASE_URL)
         self.model = model or os.getenv("TONGYI_MODEL", DEFAULT_TONGYI_MODEL)
 
-        self.client = TongyiClient(
-            api_key=self.api_key,
-            base_url=self.base_url,
-            model=self.model,
-        )
+        self.client = _shared_client(self.api_key, self.base_url, self.model)
 
-        self.conversation_histories: Dict[str, List[Dict[str, str]]] = {}
+        self.conversation_histories: Dict[str, _History] = {}
         self.default_user_id = "default"
+        # Caps in-flight requests from the async variants; a thread semaphore
+        # works across event loops because each call runs in a worker thread
+        self._request_slots = threading.BoundedSemaphore(max(1, max_concurrent_requests))
+        # Completions keyed by a hash of the full request; survives reset_conversation
+        self.response_cache = LRUCache(response_cache_size)
 
     def analyze_document_with_vision(self, image_base64: str, prompt: Optional[str] = None) -> str:
         """Placeholder for future Tongyi vision support."""
@@ -116,72 +553,155 @@ class FinancialLLM:
         financial_data: Dict[str, Any],
         ratios: Dict[str, float],
         risks: List[Dict[str, str]],
+        use_cache: bool = True,
     ) -> str:
         """Generate comprehensive insights from financial analysis."""
 
-        prompt = (
-            f"As a financial analyst, provide comprehensive insights based on this financial data:\n\n"
+        messages = self._insights_messages(financial_data, ratios, risks)
+        return self._complete(messages, temperature=0.35, max_tokens=900, use_cache=use_cache)
+
+    def generate_financial_insights_stream(
+        self,
+        financial_data: Dict[str, Any],
+        ratios: Dict[str, float],
+        risks: List[Dict[str, str]],
+        use_cache: bool = True,
+    ) -> Iterator[str]:
+        """Streaming variant of :meth:`generate_financial_insights` yielding text chunks."""
+
+        messages = self._insights_messages(financial_data, ratios, risks)
+        yield from self._complete_stream(messages, temperature=0.35, max_tokens=900, use_cache=use_cache)
+
+    def _insights_messages(
+        self,
+        financial_data: Dict[str, Any],
+        ratios: Dict[str, float],
+        risks: List[Dict[str, str]],
+    ) -> List[Dict[str, str]]:
+        context_str = _fit_tokens(
             f"Financial Metrics:\n{self._format_dict(financial_data)}\n\n"
             f"Financial Ratios:\n{self._format_dict(ratios)}\n\n"
-            f"Identified Risks:\n{self._format_risks(risks)}\n\n"
+            f"Identified Risks:\n{self._format_risks(risks)}",
+            CONTEXT_TOKEN_LIMIT,
+        )
+        prompt = (
+            f"As a financial analyst, provide comprehensive insights based on this financial data:\n\n"
+            f"{context_str}\n\n"
             "Please provide:\n1. Overall financial health assessment\n2. Key strengths and weaknesses\n"
             "3. Trends and patterns\n4. Recommendations for stakeholders\n5. Areas requiring attention\n\n"
             "Be specific, actionable, and professional."
         )
 
-        messages = [
+        return [
             {"role": "system", "content": self._build_system_prompt()},
             {"role": "user", "content": prompt},
         ]
 
-        return self._complete(messages, temperature=0.35, max_tokens=900)
-
     def answer_question(
         self,
         question: str,
         context: Dict[str, Any],
         user_id: Optional[str] = None,
+        use_cache: bool = True,
     ) -> str:
         """Answer user questions about the financial statement."""
 
-        context_str = (
-            f"Financial Data Available:\n{self._format_dict(context.get('financial_data', {}))}\n\n"
-            f"Financial Ratios:\n{self._format_dict(context.get('ratios', {}))}\n\n"
-            f"Risks:\n{self._format_risks(context.get('risks', []))}\n\n"
-            f"Trends:\n{self._format_dict(context.get('trends', {}))}\n"
-        )
-
         active_user_id = user_id or self.default_user_id
-        messages = [
-            {
-                "role": "system",
-                "content": self._build_system_prompt(
-                    "Always leverage the supplied financial context and keep your answer concise."
-                ),
-            },
-            {
-                "role": "user",
-                "content": f"Financial context for this user:\n{context_str}\nAcknowledge the context before answering follow-up questions.",
-            },
-        ]
-        messages.extend(self._get_history(active_user_id))
+        messages = self._build_qa_messages(context, active_user_id)
         messages.append({"role": "user", "content": question})
 
-        answer = self._complete(messages, temperature=0.3, max_tokens=650)
+        answer = self._complete(messages, temperature=0.3, max_tokens=650, use_cache=use_cache)
         self._update_history(active_user_id, "user", question)
         self._update_history(active_user_id, "assistant", answer)
         return answer
 
-    def generate_summary(self, document_text: str) -> str:
-        """Generate a concise summary of the financial statement."""
+    def answer_question_stream(
+        self,
+        question: str,
+        context: Dict[str, Any],
+        user_id: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> Iterator[str]:
+        """Streaming variant of :meth:`answer_question` yielding text chunks.
+
+        The exchange is added to the conversation history once the stream is
+        fully consumed.
+        """
+
+        active_user_id = user_id or self.default_user_id
+        messages = self._build_qa_messages(context, active_user_id)
+        messages.append({"role": "user", "content": question})
+
+        parts: List[str] = []
+        for chunk in self._complete_stream(messages, temperature=0.3, max_tokens=650, use_cache=use_cache):
+            parts.append(chunk)
+            yield chunk
+        self._update_history(active_user_id, "user", question)
+        self._update_history(active_user_id, "assistant", "".join(parts).strip())
+
+    def answer_questions(
+        self,
+        questions: List[str],
+        context: Dict[str, Any],
+        user_id: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> List[str]:
+        """Answer several questions with a single request.
+
+        The financial context is sent once for the whole batch instead of once
+        per question. Answers are returned in the same order as ``questions``;
+        an answer the model left out comes back as an empty string.
+        """
 
+        if not questions:
+            return []
+        if len(questions) == 1:
+            return [self.answer_question(questions[0], context, user_id=user_id, use_cache=use_cache)]
+
+        active_user_id = user_id or self.default_user_id
+        messages = self._build_qa_messages(context, active_user_id)
+        numbered = "\n".join(f"{index}. {question}" for index, question in enumerate(questions, 1))
+        messages.append(
+            {"role": "user", "content": _BATCH_QUESTIONS_TEMPLATE.format(questions=numbered)}
+        )
+
+        raw = self._complete(
+            messages,
+            temperature=0.3,
+            max_tokens=min(4000, 650 * len(questions)),
+            response_format={"type": "json_object"},
+            use_cache=use_cache,
+        )
+        answers = self._parse_batch_answers(raw, len(questions))
+        for question, answer in zip(questions, answers):
+            self._update_history(active_user_id, "user", question)
+            self._update_history(active_user_id, "assistant", answer)
+        return answers
+
+    def generate_summary(self, document_text: TextSource, use_cache: bool = True) -> str:
+        """Generate a concise summary of the financial statement.
+
+        ``document_text`` may be a string or an iterable of page texts.
+        """
+
+        messages = self._summary_messages(document_text)
+        return self._complete(messages, temperature=0.4, max_tokens=520, use_cache=use_cache)
+
+    def generate_summary_stream(self, document_text: TextSource, use_cache: bool = True) -> Iterator[str]:
+        """Streaming variant of :meth:`generate_summary` yielding text chunks."""
+
+        messages = self._summary_messages(document_text)
+        yield from self._complete_stream(messages, temperature=0.4, max_tokens=520, use_cache=use_cache)
+
+    def _summary_messages(self, document_text: TextSource) -> List[Dict[str, str]]:
+        excerpt = _take_tokens(document_text, SUMMARY_TOKEN_LIMIT)
         prompt = (
             "Summarize the following financial statement, highlighting:\n"
             "1. Key financial figures\n2. Most important insights\n3. Notable changes or trends\n\n"
-            f"Document:\n{document_text[:3000]}\n\nProvide a concise, structured summary."
+            f"Document:\n{excerpt}\n\nProvide a concise, structured summary."
         )
 
-        messages = [
+        return [
             {
                 "role": "system",
                 "content": self._build_system_prompt(
@@ -191,118 +711,124 @@ class FinancialLLM:
             {"role": "user", "content": prompt},
         ]
 
-        return self._complete(messages, temperature=0.4, max_tokens=520)
-
     def extract_structured_data(
         self,
-        document_text: str,
+        document_text: TextSource,
         *,
         period_hint: Optional[str] = None,
+        use_cache: bool = True,
     ) -> Dict[str, Any]:
-        """Ask Tongyi to convert raw financial text into structured metrics."""
+        """Ask Tongyi to convert raw financial text into structured metrics.
 
-        if not document_text.strip():
-            return {}
+        ``document_text`` may be a string or an iterable of page texts.
+        """
 
-        schema_example = json.dumps(
-            {
-                "metadata": {
-                    "entity": "ACME Corp",
-                    "period_label": "FY2023",
-                    "fiscal_year": "2023",
-                    "currency": "USD",
-                },
-                "metrics": {
-                    "revenue": 1250000000.0,
-                    "sales": 1250000000.0,
-                    "gross_profit": 520000000.0,
-                    "operating_income": 210000000.0,
-                    "net_income": 155000000.0,
-                    "total_assets": 1800000000.0,
-                    "current_assets": 620000000.0,
-                    "total_liabilities": 950000000.0,
-                    "current_liabilities": 420000000.0,
-                    "equity": 850000000.0,
-                    "cash": 120000000.0,
-                    "operating_cash_flow": 240000000.0,
-                    "investing_cash_flow": -80000000.0,
-                    "financing_cash_flow": -60000000.0,
-                    "free_cash_flow": 160000000.0,
-                    "total_debt": 400000000.0,
-                    "interest_expense": 12000000.0,
-                },
-                "notes": [
-                    "Gross margin improved to 41% year over year.",
-                    "Net debt declined by 5% due to debt repayment.",
-                ],
-            },
-            indent=2,
+        excerpt = _fit_tokens(
+            _take_chars(document_text, EXTRACTION_CHAR_LIMIT), EXTRACTION_TOKEN_LIMIT
         )
+        if not excerpt.strip():
+            return {}
 
-        schema_partial_example = json.dumps(
-            {
-                "metadata": {
-                    "entity": "Beta Manufacturing",
-                    "period_label": "Q2 2023",
-                    "fiscal_year": "2023",
-                    "currency": "USD",
-                },
-                "metrics": {
-                    "revenue": 42000000.0,
-                    "net_income": 3200000.0,
-                    "total_assets": None,
-                    "equity": None,
-                    "operating_cash_flow": 5800000.0,
-                    "investing_cash_flow": -1200000.0,
-                    "free_cash_flow": 4600000.0,
-                },
-                "notes": [
-                    "Management guidance points to stable demand for the remainder of FY2023."
-                ],
-            },
-            indent=2,
+        user_prompt = _EXTRACT_USER_TEMPLATE.format(
+            excerpt=excerpt,
+            period_hint=period_hint or "unknown",
         )
 
-        excerpt = document_text[:6000]
-        system_prompt = textwrap.dedent(
-            f"""
-            You are a forensic accountant extracting structured metrics from corporate filings. Always respond with
-            JSON that matches this schema (omit fields by setting them to null, never invent new keys):
-            {schema_example}
-
-            Partial responses are allowed when a figure is missing. Example:
-            {schema_partial_example}
-
-            Rules:
-            1. Return numbers as floats in USD with no units or thousands separators.
-            2. If a value is unknown, set it to null instead of guessing.
-            3. Use the notes array for any qualitative insights (max 3 short strings).
-            4. Keep output strictly in JSON—no commentary before or after the object.
-            """
-        ).strip()
-
-        user_prompt = textwrap.dedent(
-            f"""
-            Document excerpt:
-            {excerpt}
-
-            Period hint: {period_hint or 'unknown'}
-            Extract the metrics above and output JSON that follows the schema exactly.
-            """
-        ).strip()
-
         raw = self._complete(
             [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": _EXTRACT_SYSTEM_PROMPT},
                 {"role": "user", "content": user_prompt},
             ],
             temperature=0.1,
             max_tokens=900,
             response_format={"type": "json_object"},
+            use_cache=use_cache,
         )
         payload = self._safe_json_loads(raw)
         return self._normalize_structured_payload(payload)
 
+    async def aanalyze_document_with_vision(self, image_base64: str, prompt: Optional[str] = None) -> str:
+        """Async variant of :meth:`analyze_document_with_vision`."""
+
+        return await self._run_in_thread(self.analyze_document_with_vision, image_base64, prompt)
+
+    async def agenerate_financial_insights(
+        self,
+        financial_data: Dict[str, Any],
+        ratios: Dict[str, float],
+        risks: List[Dict[str, str]],
+        use_cache: bool = True,
+    ) -> str:
+        """Async variant of :meth:`generate_financial_insights`."""
+
+        return await self._run_in_thread(
+            self.generate_financial_insights, financial_data, ratios, risks, use_cache
+        )
+
+    async def aanswer_question(
+        self,
+        question: str,
+        context: Dict[str, Any],
+        user_id: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> str:
+        """Async variant of :meth:`answer_question`."""
+
+        return await self._run_in_thread(self.answer_question, question, context, user_id, use_cache)
+
+    async def agenerate_summary(self, document_text: TextSource, use_cache: bool = True) -> str:
+        """Async variant of :meth:`generate_summary`."""
+
+        return await self._run_in_thread(self.generate_summary, document_text, use_cache)
+
+    async def aextract_structured_data(
+        self,
+        document_text: TextSource,
+        *,
+        period_hint: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """Async variant of :meth:`extract_structured_data`."""
+
+        return await self._run_in_thread(
+            self.extract_structured_data, document_text, period_hint=period_hint, use_cache=use_cache
+        )
+
+    async def run_all(
+        self,
+        document_text: TextSource,
+        financial_data: Dict[str, Any],
+        ratios: Dict[str, float],
+        risks: List[Dict[str, str]],
+        image_base64: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Run the independent per-document calls concurrently.
+
+        Returns a dict with ``summary`` and ``insights`` (plus ``vision`` when an
+        image is supplied). Calls the provider does not support, such as vision
+        today, raise ``NotImplementedError`` and are left out of the result. Any
+        other error is raised only after every call has finished, so no request
+        is left running in the background.
+        """
+
+        calls: Dict[str, Awaitable[str]] = {
+            "summary": self.agenerate_summary(document_text),
+            "insights": self.agenerate_financial_insights(financial_data, ratios, risks),
+        }
+        if image_base64:
+            calls["vision"] = self.aanalyze_document_with_vision(image_base64)
+        results = await asyncio.gather(*calls.values(), return_exceptions=True)
+
+        outputs: Dict[str, Any] = {}
+        for key, result in zip(calls, results):
+            if isinstance(result, NotImplementedError):
+                logger.warning("Skipping %s: %s", key, result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                outputs[key] = result
+        return outputs
+
     def reset_conversation(self, user_id: Optional[str] = None) -> None:
         """Clear conversation history for a user or entirely."""
 
@@ -311,17 +837,78 @@ class FinancialLLM:
         else:
             self.conversation_histories.clear()
 
-    def _format_dict(self, data: Dict) -> str:
-        """Format dictionary for display."""
+    def _format_dict(self, data: Dict[str, Any]) -> str:
+        """Format dictionary for display, rounding floats to keep prompts short.
+
+        Keys are sorted so the same data always renders to the same text, which
+        keeps the context prefix byte-identical across turns for prompt caching.
+        """
         if not data:
             return "  - None"
-        return "\n".join([f"  - {k}: {v}" for k, v in data.items()])
+        return "\n".join(f"  - {k}: {self._format_value(data[k])}" for k in sorted(data))
+
+    @staticmethod
+    def _format_value(value: Any) -> Any:
+        if isinstance(value, float):
+            return f"{value:,.2f}"
+        return value
 
     def _format_risks(self, risks: List[Dict[str, str]]) -> str:
         """Format risks list for display."""
         if not risks:
             return "  - No significant risks identified"
-        return "\n".join([f"  - [{r.get('severity','N/A')}] {r.get('type','')}: {r.get('description','')}" for r in risks])
+        return "\n".join(
+            f"  - [{r.get('severity', 'N/A')}] {r.get('type', '')}: {r.get('description', '')}" for r in risks
+        )
+
+    def _build_qa_messages(self, context: Dict[str, Any], user_id: str) -> List[Dict[str, str]]:
+        context_str = _fit_tokens(
+            f"Financial Data Available:\n{self._format_dict(context.get('financial_data', {}))}\n\n"
+            f"Financial Ratios:\n{self._format_dict(context.get('ratios', {}))}\n\n"
+            f"Risks:\n{self._format_risks(context.get('risks', []))}\n\n"
+            f"Trends:\n{self._format_dict(context.get('trends', {}))}\n",
+            CONTEXT_TOKEN_LIMIT,
+        )
+
+        # Static instructions and context lead, history follows and only the new
+        # question changes at the tail, so providers can reuse the cached prefix
+        messages = [
+            {
+                "role": "system",
+                "content": self._build_system_prompt(
+                    "Always leverage the supplied financial context and keep your answer concise."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"Financial context for this user:\n{context_str}\nAcknowledge the context before answering follow-up questions.",
+            },
+        ]
+        messages.extend(self._get_history(user_id))
+        return messages
+
+    def _parse_batch_answers(self, raw: str, count: int) -> List[str]:
+        answers: List[str] = []
+        payload = self._safe_json_loads(raw)
+        if payload:
+            items = payload.get("answers")
+            if isinstance(items, list):
+                for item in items:
+                    answer = item.get("a") if isinstance(item, dict) else item
+                    answers.append("" if answer is None else str(answer).strip())
+            else:
+                # Splitting JSON text on item numbers would only produce noise
+                logger.warning(
+                    "Batch answer JSON has no 'answers' list (keys: %s); returning empty answers.",
+                    sorted(payload),
+                )
+        else:
+            # Not JSON: split a "1. ... 2. ..." style reply on its item numbers
+            parts = _NUMBERED_ITEM_RE.split(raw)
+            answers = [parts[index + 1].strip() for index in range(1, len(parts) - 1, 2)]
+        answers = answers[:count]
+        answers.extend([""] * (count - len(answers)))
+        return answers
 
     def _build_system_prompt(self, extra: Optional[str] = None) -> str:
         base = (
@@ -332,6 +919,13 @@ class FinancialLLM:
             base = f"{base} {extra.strip()}"
         return base
 
+    async def _run_in_thread(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        def call() -> T:
+            with self._request_slots:
+                return func(*args, **kwargs)
+
+        return await asyncio.to_thread(call)
+
     def _complete(
         self,
         messages: List[Dict[str, Any]],
@@ -339,7 +933,15 @@ class FinancialLLM:
         max_tokens: int = 800,
         response_format: Optional[Dict[str, Any]] = None,
         model: Optional[str] = None,
+        use_cache: bool = True,
     ) -> str:
+        cache_key = None
+        if use_cache:
+            cache_key = self._cache_key(messages, temperature, max_tokens, response_format, model)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         response = self.client.create_chat_completion(
             messages=messages,
             temperature=temperature,
@@ -348,33 +950,91 @@ class FinancialLLM:
             model=model,
         )
         try:
-            return response["choices"][0]["message"]["content"].strip()
+            content = response["choices"][0]["message"]["content"].strip()
         except (KeyError, IndexError):
             raise RuntimeError("Tongyi response did not include completion text.")
 
+        if cache_key is not None:
+            self.response_cache.set(cache_key, content)
+        return content
+
+    def _complete_stream(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float = 0.4,
+        max_tokens: int = 800,
+        model: Optional[str] = None,
+        use_cache: bool = True,
+    ) -> Iterator[str]:
+        # Shares cache entries with _complete: a cached answer is yielded whole
+        cache_key = None
+        if use_cache:
+            cache_key = self._cache_key(messages, temperature, max_tokens, None, model)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        parts: List[str] = []
+        for chunk in self.client.stream_chat_completion(
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=model,
+        ):
+            parts.append(chunk)
+            yield chunk
+
+        if cache_key is not None:
+            self.response_cache.set(cache_key, "".join(parts).strip())
+
+    def _cache_key(
+        self,
+        messages: List[Dict[str, Any]],
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[Dict[str, Any]],
+        model: Optional[str],
+    ) -> str:
+        request = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "response_format": response_format,
+        }
+        return hashlib.sha256(_json_dumps(request)).hexdigest()
+
     def _get_history(self, user_id: str) -> List[Dict[str, str]]:
-        history = self.conversation_histories.get(user_id, [])
-        return history[-10:]
+        """Return the most recent messages that fit in HISTORY_TOKEN_BUDGET, oldest first."""
+        history = self.conversation_histories.get(user_id)
+        if not history:
+            return []
+        return history.window(HISTORY_TOKEN_BUDGET)
 
     def _update_history(self, user_id: str, role: str, content: str) -> None:
-        history = self.conversation_histories.setdefault(user_id, [])
-        history.append({"role": role, "content": content})
-        if len(history) > 20:
-            self.conversation_histories[user_id] = history[-20:]
+        # Token counts are computed once here rather than on every prompt build
+        history = self.conversation_histories.get(user_id)
+        if history is None:
+            history = self.conversation_histories[user_id] = _History()
+        history.append(role, content, _count_tokens(content))
 
     def _safe_json_loads(self, payload: str) -> Dict[str, Any]:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
         try:
-            return json.loads(payload)
+            parsed = _json_loads(payload)
         except json.JSONDecodeError:
             trimmed = payload.strip()
             start = trimmed.find("{")
             end = trimmed.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                try:
-                    return json.loads(trimmed[start : end + 1])
-                except json.JSONDecodeError:
-                    return {}
-            return {}
+            if start == -1 or end == -1 or end <= start:
+                return {}
+            try:
+                parsed = _json_loads(trimmed[start : end + 1])
+            except json.JSONDecodeError:
+                return {}
+        # Only JSON objects are meaningful here; keep the declared return type honest
+        return parsed if isinstance(parsed, dict) else {}
 
     def _normalize_structured_payload(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         if not payload:
@@ -382,10 +1042,11 @@ class FinancialLLM:
 
         metrics = payload.get("metrics") or {}
         if not metrics:
+            # Flat payloads: one lookup per field instead of two
             metrics = {
-                field: payload.get(field)
+                field: value
                 for field in FINANCIAL_FIELDS
-                if payload.get(field) is not None
+                if (value := payload.get(field)) is not None
             }
 
         payload["metrics"] = metrics
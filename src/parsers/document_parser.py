@@ -8,21 +8,43 @@ from pathlib import Path
 import PyPDF2
 from PIL import Image
 import base64
+import copy
+import hashlib
 import io
 
+from src.utils.cache import LRUCache
+
+# Formats that can be base64-encoded as-is without re-encoding
+RAW_IMAGE_FORMATS = {'PNG', 'JPEG'}
+
+
+def file_digest(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Return a BLAKE2b digest of the file contents, used as the parse cache key.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 
 class DocumentParser:
     """
     Handles parsing of financial documents (PDF and images)
     """
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 32):
         self.supported_formats = ['.pdf', '.png', '.jpg', '.jpeg']
+        self.cache = LRUCache(cache_size)
     
     def parse_document(self, file_path: str) -> Dict[str, Any]:
         """
         Parse a financial document and extract content
         
+        Results are cached by file content, so re-uploading the same document
+        skips parsing entirely.
+        
         Args:
             file_path: Path to the document file
             
@@ -34,10 +56,21 @@ class DocumentParser:
         if file_ext not in self.supported_formats:
             raise ValueError(f"Unsupported file format: {file_ext}")
         
+        cache_key = (file_ext, file_digest(file_path))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            # Deep copy so callers can't edit the nested content held in the cache
+            result = copy.deepcopy(cached)
+            result['file_path'] = file_path
+            return result
+        
         if file_ext == '.pdf':
-            return self._parse_pdf(file_path)
+            result = self._parse_pdf(file_path)
         else:
-            return self._parse_image(file_path)
+            result = self._parse_image(file_path)
+        
+        self.cache.set(cache_key, copy.deepcopy(result))
+        return result
     
     def _parse_pdf(self, file_path: str) -> Dict[str, Any]:
         """Extract text from PDF file"""
@@ -64,12 +97,20 @@ class DocumentParser:
     
     def _parse_image(self, file_path: str) -> Dict[str, Any]:
         """Process image file for multimodal analysis"""
-        image = Image.open(file_path)
+        with open(file_path, 'rb') as file:
+            raw = file.read()
+        
+        # Image.open only reads the header here; pixels are not decoded
+        image = Image.open(io.BytesIO(raw))
         
         # Convert image to base64 for API transmission
-        buffered = io.BytesIO()
-        image.save(buffered, format=image.format or 'PNG')
-        img_base64 = base64.b64encode(buffered.getvalue()).decode()
+        if image.format in RAW_IMAGE_FORMATS:
+            # Already an API-friendly format, so send the original bytes
+            img_base64 = base64.b64encode(raw).decode()
+        else:
+            buffered = io.BytesIO()
+            image.save(buffered, format=image.format or 'PNG')
+            img_base64 = base64.b64encode(buffered.getvalue()).decode()
         
         return {
             'type': 'image',
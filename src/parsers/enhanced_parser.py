@@ -3,19 +3,30 @@ Enhanced document parser supporting Excel, CSV, and XBRL formats
 """
 
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional
 from pathlib import Path
 import PyPDF2
 from PIL import Image
 import base64
+import copy
 import io
 
+from src.utils.cache import LRUCache
+
+from .document_parser import RAW_IMAGE_FORMATS, file_digest
+
 try:
     import pandas as pd
     PANDAS_AVAILABLE = True
 except ImportError:
     PANDAS_AVAILABLE = False
 
+try:
+    from pyarrow import ArrowInvalid
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 try:
     import openpyxl
     OPENPYXL_AVAILABLE = True
@@ -28,15 +39,25 @@ class EnhancedDocumentParser:
     Handles parsing of financial documents (PDF, images, Excel, CSV, XBRL)
     """
     
-    def __init__(self):
+    def __init__(self, cache_size: int = 32):
         self.supported_formats = ['.pdf', '.png', '.jpg', '.jpeg', '.xls', '.xlsx', '.csv', '.xbrl', '.xml']
+        self.cache = LRUCache(cache_size)
     
-    def parse_document(self, file_path: str) -> Dict[str, Any]:
+    def parse_document(
+        self,
+        file_path: str,
+        on_page: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
         """
         Parse a financial document and extract content
         
+        Results are cached by file content, so re-uploading the same document
+        skips parsing entirely.
+        
         Args:
             file_path: Path to the document file
+            on_page: Optional callback invoked with each PDF page's text as soon
+                as it is extracted, so callers can start work before parsing ends
             
         Returns:
             Dictionary containing extracted text and metadata
@@ -46,20 +67,38 @@ class EnhancedDocumentParser:
         if file_ext not in self.supported_formats:
             raise ValueError(f"Unsupported file format: {file_ext}")
         
+        cache_key = (file_ext, file_digest(file_path))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            if on_page and cached.get('type') == 'pdf':
+                for page in cached['content']:
+                    on_page(page['text'])
+            # Deep copy so callers can't edit the nested content held in the cache
+            result = copy.deepcopy(cached)
+            result['file_path'] = file_path
+            return result
+        
         if file_ext == '.pdf':
-            return self._parse_pdf(file_path)
+            result = self._parse_pdf(file_path, on_page)
         elif file_ext in ['.png', '.jpg', '.jpeg']:
-            return self._parse_image(file_path)
+            result = self._parse_image(file_path)
         elif file_ext in ['.xls', '.xlsx']:
-            return self._parse_excel(file_path)
+            result = self._parse_excel(file_path)
         elif file_ext == '.csv':
-            return self._parse_csv(file_path)
+            result = self._parse_csv(file_path)
         elif file_ext in ['.xbrl', '.xml']:
-            return self._parse_xbrl(file_path)
+            result = self._parse_xbrl(file_path)
         else:
             raise ValueError(f"Unsupported format: {file_ext}")
+        
+        self.cache.set(cache_key, copy.deepcopy(result))
+        return result
     
-    def _parse_pdf(self, file_path: str) -> Dict[str, Any]:
+    def _parse_pdf(
+        self,
+        file_path: str,
+        on_page: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
         """Extract text from PDF file"""
         text_content = []
         
@@ -74,6 +113,8 @@ class EnhancedDocumentParser:
                     'page': page_num + 1,
                     'text': text
                 })
+                if on_page:
+                    on_page(text)
         
         return {
             'type': 'pdf',
@@ -84,12 +125,20 @@ class EnhancedDocumentParser:
     
     def _parse_image(self, file_path: str) -> Dict[str, Any]:
         """Process image file for multimodal analysis"""
-        image = Image.open(file_path)
+        with open(file_path, 'rb') as file:
+            raw = file.read()
+        
+        # Image.open only reads the header here; pixels are not decoded
+        image = Image.open(io.BytesIO(raw))
         
         # Convert image to base64 for API transmission
-        buffered = io.BytesIO()
-        image.save(buffered, format=image.format or 'PNG')
-        img_base64 = base64.b64encode(buffered.getvalue()).decode()
+        if image.format in RAW_IMAGE_FORMATS:
+            # Already an API-friendly format, so send the original bytes
+            img_base64 = base64.b64encode(raw).decode()
+        else:
+            buffered = io.BytesIO()
+            image.save(buffered, format=image.format or 'PNG')
+            img_base64 = base64.b64encode(buffered.getvalue()).decode()
         
         return {
             'type': 'image',
@@ -100,18 +149,23 @@ class EnhancedDocumentParser:
         }
     
     def _parse_excel(self, file_path: str) -> Dict[str, Any]:
-        """Parse Excel file using pandas"""
+        """
+        Parse Excel file using pandas
+        
+        All sheets are read in a single pass over the workbook. Each sheet's
+        ``data`` is stored column-wise (``{column: [values, ...]}``) rather than
+        as one dict per row.
+        """
         if not PANDAS_AVAILABLE:
             raise ValueError("pandas is required for Excel parsing. Install with: pip install pandas openpyxl")
         
-        # Read all sheets
-        excel_file = pd.ExcelFile(file_path)
+        # Read all sheets at once instead of re-opening the workbook per sheet
+        all_sheets = pd.read_excel(file_path, sheet_name=None)
         sheets_data = {}
         
-        for sheet_name in excel_file.sheet_names:
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
+        for sheet_name, df in all_sheets.items():
             sheets_data[sheet_name] = {
-                'data': df.to_dict('records'),
+                'data': df.to_dict('list'),
                 'columns': df.columns.tolist(),
                 'shape': df.shape
             }
@@ -124,37 +178,68 @@ class EnhancedDocumentParser:
         }
     
     def _parse_csv(self, file_path: str) -> Dict[str, Any]:
-        """Parse CSV file using pandas"""
+        """
+        Parse CSV file using pandas
+        
+        Uses the multithreaded pyarrow reader when it is installed. That reader
+        rejects ragged rows, so files it cannot read fall back to the default C
+        engine, which pads short rows with NaN. Like the Excel sheets, ``data``
+        is stored column-wise.
+        """
         if not PANDAS_AVAILABLE:
             raise ValueError("pandas is required for CSV parsing. Install with: pip install pandas")
         
-        df = pd.read_csv(file_path)
+        df = None
+        if PYARROW_AVAILABLE:
+            try:
+                df = pd.read_csv(file_path, engine='pyarrow')
+            except (pd.errors.ParserError, ArrowInvalid):
+                df = None
+        if df is None:
+            df = pd.read_csv(file_path)
         
         return {
             'type': 'csv',
-            'data': df.to_dict('records'),
+            'data': df.to_dict('list'),
             'columns': df.columns.tolist(),
             'shape': df.shape,
             'file_path': file_path
         }
     
     def _parse_xbrl(self, file_path: str) -> Dict[str, Any]:
-        """Parse XBRL file"""
+        """
+        Parse XBRL file
+        
+        The document is scanned with ``iterparse`` and each element is cleared
+        once its text has been read, so memory stays proportional to the
+        nesting depth instead of the size of the filing.
+        """
         import xml.etree.ElementTree as ET
         
         try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            
             # Extract financial data from XBRL
             financial_data = {}
-            namespaces = {'xbrli': 'http://www.xbrl.org/2003/instance'}
+            root = None
+            depth = 0
             
             # This is a simplified parser - production would need more sophisticated parsing
-            for elem in root.iter():
+            for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    depth += 1
+                    continue
+                
+                depth -= 1
                 if elem.text and elem.text.strip():
                     tag_name = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
                     financial_data[tag_name] = elem.text.strip()
+                
+                if elem is not root:
+                    elem.clear()
+                    if depth == 1:
+                        # Drop processed top-level facts from the root element
+                        del root[:]
             
             return {
                 'type': 'xbrl',
@@ -1,12 +1,19 @@
 # Utils package
+#
+# Public helpers are resolved on first attribute access (PEP 562), so importing
+# a light submodule such as src.utils.cache does not load pandas through
+# data_extraction.
 
-from .data_extraction import (
-    extract_from_structured_data,
-    extract_from_xbrl,
-    build_cash_flow_summary,
-    merge_llm_structured_data,
-)
-from .peer_benchmark import PeerBenchmark
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+_LAZY = {
+    'extract_from_structured_data': ('.data_extraction', 'extract_from_structured_data'),
+    'extract_from_xbrl': ('.data_extraction', 'extract_from_xbrl'),
+    'build_cash_flow_summary': ('.data_extraction', 'build_cash_flow_summary'),
+    'merge_llm_structured_data': ('.data_extraction', 'merge_llm_structured_data'),
+    'PeerBenchmark': ('.peer_benchmark', 'PeerBenchmark'),
+}
 
 __all__ = [
     'extract_from_structured_data',
@@ -15,3 +22,27 @@ __all__ = [
     'merge_llm_structured_data',
     'PeerBenchmark',
 ]
+
+if TYPE_CHECKING:
+    from .data_extraction import (
+        extract_from_structured_data,
+        extract_from_xbrl,
+        build_cash_flow_summary,
+        merge_llm_structured_data,
+    )
+    from .peer_benchmark import PeerBenchmark
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module_name, attr = _LAZY[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(module_name, __name__), attr)
+    # Cache on the package so later lookups skip __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
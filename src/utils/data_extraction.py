@@ -4,10 +4,18 @@ Utilities for extracting structured financial data from spreadsheets, CSV, and X
 
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import functools
 import math
 import re
 
+try:
+    import numpy as np
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
 FINANCIAL_FIELDS = [
     'revenue',
     'sales',
@@ -31,6 +39,9 @@ FINANCIAL_FIELDS = [
     'interest_expense'
 ]
 
+# For membership tests; FINANCIAL_FIELDS keeps the canonical order
+FINANCIAL_FIELDS_SET = frozenset(FINANCIAL_FIELDS)
+
 KEYWORD_MAP = {
     'revenue': ['revenue', 'sales', 'total revenue', 'net sales'],
     'sales': ['sales', 'net sales'],
@@ -56,12 +67,42 @@ KEYWORD_MAP = {
 
 ROW_LABEL_KEYS = {'metric', 'item', 'description', 'account', 'name', 'line', 'category'}
 
+# KEYWORD_MAP tags in the space-free, lower-case form used to match XBRL element names
+_NORMALIZED_TAGS = {
+    field: [tag.replace(' ', '').lower() for tag in tags]
+    for field, tags in KEYWORD_MAP.items()
+}
+
+# Bulk equivalents of the _to_number cleanup, as plain pattern strings so
+# pandas can run them natively on Arrow-backed string columns
+_BULK_STRIP_PATTERN = r'[,$% ]'
+_PLAIN_NUMBER_PATTERN = r'-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)'
+
+# Column-wise tables with at least this many rows go through the pandas path
+VECTORIZE_MIN_ROWS = 64
+
+# Precompiled once: these run for every cell of every parsed table
+_NUM_CLEAN_RE = re.compile(r'[^0-9.\-]')
+_NUM_DELETE_TABLE = str.maketrans('', '', ',$% USD')
+# Each keyword ranked by the first field (in KEYWORD_MAP order) that lists it
+_KEYWORD_RANK: Dict[str, Tuple[int, str]] = {}
+for _rank, (_field, _keywords) in enumerate(KEYWORD_MAP.items()):
+    for _keyword in _keywords:
+        _KEYWORD_RANK.setdefault(_keyword, (_rank, _field))
+del _rank, _field, _keywords, _keyword
+
+# Zero-width lookahead so overlapping keywords are all reported in one scan;
+# alternatives are in rank order, so each position yields its best keyword
+_KEYWORD_SCAN_RE = re.compile(
+    '(?=(' + '|'.join(re.escape(keyword) for keyword in _KEYWORD_RANK) + '))'
+)
+
 
 def initialize_financial_data() -> Dict[str, Optional[float]]:
     """
     Return a dictionary with all expected financial fields initialized to None.
     """
-    return {field: None for field in FINANCIAL_FIELDS}
+    return dict.fromkeys(FINANCIAL_FIELDS, None)
 
 
 def extract_from_structured_data(parsed_doc: Dict[str, Any]) -> Dict[str, Optional[float]]:
@@ -73,70 +114,192 @@ def extract_from_structured_data(parsed_doc: Dict[str, Any]) -> Dict[str, Option
     if not parsed_doc:
         return financial_data
     
-    rows: List[Dict[str, Any]] = []
+    tables: List[Any] = []
     
     if parsed_doc.get('type') == 'excel':
         for sheet in (parsed_doc.get('content') or {}).values():
-            rows.extend(sheet.get('data', []))
+            tables.append(sheet.get('data', []))
     elif parsed_doc.get('type') == 'csv':
-        rows = parsed_doc.get('data', [])
+        tables.append(parsed_doc.get('data', []))
     else:
         return financial_data
     
+    # Fields are only ever filled once, so stop scanning when none are left
+    remaining = set(FINANCIAL_FIELDS_SET)
+    
+    for table in tables:
+        if PANDAS_AVAILABLE and _is_large_columnar(table):
+            _extract_from_columns(table, financial_data, remaining)
+        else:
+            _extract_from_rows(_iter_rows(table), financial_data, remaining)
+        if not remaining:
+            break
+    
+    # Derive free cash flow if not provided but operating/investing cash flows exist
+    if financial_data['free_cash_flow'] is None:
+        op_cf = financial_data.get('operating_cash_flow')
+        inv_cf = financial_data.get('investing_cash_flow')
+        if op_cf is not None and inv_cf is not None:
+            financial_data['free_cash_flow'] = op_cf + inv_cf
+    
+    return financial_data
+
+
+def _extract_from_rows(
+    rows: Iterable[Any],
+    financial_data: Dict[str, Optional[float]],
+    remaining: Set[str],
+) -> None:
+    """
+    Fill ``financial_data`` from row dictionaries, discarding filled fields from ``remaining``.
+    """
     for row in rows:
         if not isinstance(row, dict):
             continue
         
-        # First pass: look for direct key matches (column headers)
+        # Column headers naming a metric take precedence over metric labels in
+        # the row's values (e.g. a Metric column), so labels are applied after
+        # the whole row has been scanned once. A label column (Metric, Item,
+        # ...) is just a string value here, so no separate pass is needed.
+        labelled: List[Tuple[Any, str]] = []
         for key, value in row.items():
             field = _match_keyword(str(key))
-            numeric_value = _to_number(value)
-            if field and numeric_value is not None and financial_data.get(field) is None:
-                financial_data[field] = numeric_value
+            if field in remaining:
+                numeric_value = _to_number(value)
+                if numeric_value is not None:
+                    financial_data[field] = numeric_value
+                    remaining.discard(field)
+            if isinstance(value, str):
+                label_field = _match_keyword(value)
+                if label_field:
+                    labelled.append((key, label_field))
         
-        # Second pass: look for metric labels in row values (e.g., Metric column)
-        for key, value in row.items():
-            if value is None:
+        for key, field in labelled:
+            if field not in remaining:
                 continue
-            if isinstance(value, str) and _match_keyword(value):
-                field = _match_keyword(value)
-                if field and financial_data.get(field) is None:
-                    numeric_candidates = [
-                        _to_number(row.get(other_key))
-                        for other_key in row.keys()
-                        if other_key != key
-                    ]
-                    numeric_candidates = [v for v in numeric_candidates if v is not None]
-                    if numeric_candidates:
-                        financial_data[field] = numeric_candidates[0]
-        
-        # Third pass: look for dedicated metric columns (e.g., Metric/FY2023 structure)
-        label_value = None
-        for potential_key in ROW_LABEL_KEYS:
-            if potential_key in row:
-                label_value = row.get(potential_key)
-                break
+            numeric_value = _first_numeric(row, key)
+            if numeric_value is not None:
+                financial_data[field] = numeric_value
+                remaining.discard(field)
         
-        if isinstance(label_value, str):
-            field = _match_keyword(label_value)
-            if field and financial_data.get(field) is None:
-                numeric_candidates = [
-                    _to_number(row.get(other_key))
-                    for other_key in row.keys()
-                    if other_key not in ROW_LABEL_KEYS
-                ]
-                numeric_candidates = [v for v in numeric_candidates if v is not None]
-                if numeric_candidates:
-                    financial_data[field] = numeric_candidates[0]
+        if not remaining:
+            break
+
+
+def _first_numeric(row: Dict[Any, Any], skip_key: Any) -> Optional[float]:
+    """
+    Return the first numeric cell in ``row`` other than ``skip_key``'s, or None.
+    """
+    for other_key, other_value in row.items():
+        if other_key == skip_key:
+            continue
+        numeric_value = _to_number(other_value)
+        if numeric_value is not None:
+            return numeric_value
+    return None
+
+
+def _is_large_columnar(table: Any) -> bool:
+    if not isinstance(table, dict) or not table:
+        return False
+    lengths = {len(values) for values in table.values()}
+    return len(lengths) == 1 and lengths.pop() >= VECTORIZE_MIN_ROWS
+
+
+def _numeric_column(column: 'pd.Series') -> 'np.ndarray':
+    """
+    Coerce a column with the same rules as ``_to_number``; unparsable cells become NaN.
+    """
+    if column.dtype.kind in 'biuf':
+        values = column.to_numpy(dtype=float, na_value=np.nan, copy=True)
+        values[~np.isfinite(values)] = np.nan
+        return values
     
-    # Derive free cash flow if not provided but operating/investing cash flows exist
-    if financial_data['free_cash_flow'] is None:
-        op_cf = financial_data.get('operating_cash_flow')
-        inv_cf = financial_data.get('investing_cash_flow')
-        if op_cf is not None and inv_cf is not None:
-            financial_data['free_cash_flow'] = op_cf + inv_cf
+    try:
+        cleaned = column.str.strip().str.replace(_BULK_STRIP_PATTERN, '', regex=True)
+    except AttributeError:
+        # No string cells at all
+        return np.array([_to_number(value) for value in column], dtype=float)
     
-    return financial_data
+    # Cells that are plain numbers once separators and symbols are gone are
+    # converted together; anything else (parentheses, text, non-strings) goes
+    # through _to_number one cell at a time
+    plain = cleaned.str.fullmatch(_PLAIN_NUMBER_PATTERN).fillna(False).to_numpy(dtype=bool)
+    values = np.full(len(column), np.nan)
+    if plain.any():
+        values[plain] = cleaned[plain].to_numpy(dtype=object).astype(float)
+    rest = ~plain
+    if rest.any():
+        values[rest] = np.array([_to_number(value) for value in column[rest]], dtype=float)
+    return values
+
+
+def _extract_from_columns(
+    table: Dict[Any, List[Any]],
+    financial_data: Dict[str, Optional[float]],
+    remaining: Set[str],
+) -> None:
+    """
+    Column-wise equivalent of ``_extract_from_rows`` for large tables.
+
+    Keyword matching runs once per header and once per distinct label instead
+    of once per cell, rows holding a label are located with NumPy, and only
+    the header-matched columns and the labelled rows are coerced to numbers.
+    """
+    columns = list(table.keys())
+    
+    # Earliest match per field as (row, kind, column, value); header matches
+    # (kind 0) beat label matches (kind 1) within the same row
+    best: Dict[str, Tuple[int, int, int, float]] = {}
+    
+    for col, column in enumerate(columns):
+        field = _match_keyword(str(column))
+        if field in remaining:
+            values = _numeric_column(pd.Series(table[column]))
+            hits = np.flatnonzero(~np.isnan(values))
+            if hits.size:
+                candidate = (int(hits[0]), 0, col, float(values[hits[0]]))
+                if field not in best or candidate[:3] < best[field][:3]:
+                    best[field] = candidate
+    
+    row_numbers: Dict[int, List[Optional[float]]] = {}
+    
+    def sibling_number(row: int, col: int) -> Optional[float]:
+        # First numeric cell in the row other than the label cell itself
+        if row not in row_numbers:
+            row_numbers[row] = [_to_number(table[column][row]) for column in columns]
+        for other, number in enumerate(row_numbers[row]):
+            if other != col and number is not None:
+                return number
+        return None
+    
+    for col, column in enumerate(columns):
+        series = pd.Series(table[column])
+        if series.dtype.kind in 'biufcmM':
+            continue
+        labels = {}
+        for value in series.unique():
+            if isinstance(value, str):
+                field = _match_keyword(value)
+                if field in remaining:
+                    labels[value] = field
+        if not labels:
+            continue
+        
+        label_fields = series.map(labels).to_numpy(dtype=object)
+        for field in set(labels.values()):
+            for row in np.flatnonzero(label_fields == field):
+                row = int(row)
+                if field in best and best[field][:3] < (row, 1, col):
+                    break
+                number = sibling_number(row, col)
+                if number is not None:
+                    best[field] = (row, 1, col, number)
+                    break
+    
+    for field, (_, _, _, value) in best.items():
+        financial_data[field] = value
+        remaining.discard(field)
 
 
 def extract_from_xbrl(parsed_doc: Dict[str, Any]) -> Dict[str, Optional[float]]:
@@ -150,16 +313,22 @@ def extract_from_xbrl(parsed_doc: Dict[str, Any]) -> Dict[str, Optional[float]]:
         return financial_data
     
     normalized_data = {str(k).lower(): v for k, v in xbrl_data.items()}
+    # Normalize every key once, coerce each value at most once, and join the
+    # keys so a tag that appears in none of them is ruled out in one search
+    candidates = [(key.replace(' ', ''), value) for key, value in normalized_data.items()]
+    all_keys = '\0'.join(compact_key for compact_key, _ in candidates)
+    numbers: Dict[int, Optional[float]] = {}
     
-    for field, tags in KEYWORD_MAP.items():
+    for field, tags in _NORMALIZED_TAGS.items():
         for tag in tags:
-            for candidate_key, candidate_value in normalized_data.items():
-                normalized_tag = tag.replace(' ', '').lower()
-                compact_key = candidate_key.replace(' ', '')
-                if normalized_tag == compact_key or normalized_tag in compact_key:
-                    numeric_value = _to_number(candidate_value)
-                    if numeric_value is not None:
-                        financial_data[field] = numeric_value
+            if tag not in all_keys:
+                continue
+            for index, (compact_key, candidate_value) in enumerate(candidates):
+                if tag in compact_key:
+                    if index not in numbers:
+                        numbers[index] = _to_number(candidate_value)
+                    if numbers[index] is not None:
+                        financial_data[field] = numbers[index]
                         break
             if financial_data.get(field) is not None:
                 break
@@ -218,16 +387,34 @@ def merge_llm_structured_data(
     return financial_data, metadata, notes
 
 
+def _iter_rows(table: Any) -> Iterable[Dict[str, Any]]:
+    """
+    Yield row dictionaries from either a list of records or a column-wise
+    ``{column: [values, ...]}`` mapping as produced by the enhanced parser.
+    """
+    if isinstance(table, dict):
+        columns = list(table.keys())
+        for values in zip(*table.values()):
+            yield dict(zip(columns, values))
+    else:
+        yield from table or []
+
+
+@functools.lru_cache(maxsize=4096)
 def _match_keyword(text: str) -> Optional[str]:
     """
     Attempt to map arbitrary text to one of the known financial fields.
+    
+    When several keywords occur, the field listed first in KEYWORD_MAP wins.
     """
-    text_lower = text.strip().lower()
-    for field, keywords in KEYWORD_MAP.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                return field
-    return None
+    best: Optional[Tuple[int, str]] = None
+    for match in _KEYWORD_SCAN_RE.finditer(text.strip().lower()):
+        candidate = _KEYWORD_RANK[match.group(1)]
+        if best is None or candidate < best:
+            best = candidate
+            if best[0] == 0:
+                break
+    return best[1] if best else None
 
 
 def _to_number(value: Any) -> Optional[float]:
@@ -238,7 +425,7 @@ def _to_number(value: Any) -> Optional[float]:
         return None
     
     if isinstance(value, (int, float)):
-        if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        if isinstance(value, float) and not math.isfinite(value):
             return None
         return float(value)
     
@@ -248,21 +435,19 @@ def _to_number(value: Any) -> Optional[float]:
             return None
         
         # Handle negative numbers in parentheses: (1,000) -> -1000
-        negative = False
-        if cleaned.startswith('(') and cleaned.endswith(')'):
-            negative = True
+        negative = cleaned[0] == '(' and cleaned[-1] == ')'
+        if negative:
             cleaned = cleaned[1:-1]
         
-        cleaned = cleaned.replace(',', '')
-        cleaned = cleaned.replace('$', '')
-        cleaned = cleaned.replace('%', '')
-        cleaned = cleaned.replace('USD', '')
-        cleaned = cleaned.strip()
+        # Drops separators, symbols, spaces and the letters of 'USD' in one pass
+        cleaned = cleaned.translate(_NUM_DELETE_TABLE)
         
-        # Remove any non-numeric characters except minus sign and decimal point
-        cleaned = re.sub(r'[^0-9\.\-]', '', cleaned)
-        if not cleaned or cleaned == '-':
-            return None
+        # Anything still holding characters other than digits, '-' and one '.'
+        # goes through the regex, which strips everything but those
+        if not (cleaned.isascii() and cleaned.lstrip('-').replace('.', '', 1).isdigit()):
+            cleaned = _NUM_CLEAN_RE.sub('', cleaned)
+            if not cleaned or cleaned == '-':
+                return None
         
         try:
             number = float(cleaned)
@@ -271,4 +456,3 @@ def _to_number(value: Any) -> Optional[float]:
             return None
     
     return None
-
@@ -6,6 +6,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
+from .cache import LRUCache
+
 DEFAULT_BENCHMARKS: Dict[str, Dict[str, Dict[str, float]]] = {
     'general': {
         'ratios': {
@@ -59,8 +61,19 @@ class PeerBenchmark:
     Compare company performance metrics with industry benchmarks.
     """
     
-    def __init__(self, benchmarks: Optional[Dict[str, Dict[str, Dict[str, float]]]] = None):
+    def __init__(
+        self,
+        benchmarks: Optional[Dict[str, Dict[str, Dict[str, float]]]] = None,
+        cache_size: int = 256,
+    ):
         self.benchmarks = benchmarks or DEFAULT_BENCHMARKS
+        # Display labels are built once rather than on every comparison
+        self._labels = {
+            metric: metric.replace('_', ' ').title()
+            for industry in self.benchmarks.values()
+            for metric in industry.get('ratios', {})
+        }
+        self.cache = LRUCache(cache_size)
     
     def compare(
         self,
@@ -81,6 +94,34 @@ class PeerBenchmark:
         benchmark = self.benchmarks[normalized_industry]
         benchmark_ratios = benchmark.get('ratios', {})
         
+        # Only the benchmarked ratios affect the result, so they form the key
+        cache_key = (
+            normalized_industry,
+            tuple((metric, ratios.get(metric)) for metric in benchmark_ratios),
+        )
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            cached = self._compare(normalized_industry, benchmark_ratios, ratios)
+            self.cache.set(cache_key, cached)
+        if not cached:
+            return None
+        
+        # Hand out copies so callers cannot alter the cached result
+        return {
+            **cached,
+            'metrics': [dict(metric) for metric in cached['metrics']],
+            'alerts': list(cached['alerts']),
+        }
+    
+    def _compare(
+        self,
+        normalized_industry: str,
+        benchmark_ratios: Dict[str, float],
+        ratios: Dict[str, float],
+    ) -> Dict[str, Any]:
+        """
+        Build the comparison for one industry; returns an empty dict when nothing overlaps.
+        """
         comparisons: List[Dict[str, Any]] = []
         alerts: List[str] = []
         
@@ -97,18 +138,19 @@ class PeerBenchmark:
                 'difference': round(difference, 2)
             })
             
+            label = self._labels[metric]
             if metric in {'profit_margin', 'roa', 'roe'}:
                 if difference <= -5:
-                    alerts.append(f"{metric.replace('_', ' ').title()} is {abs(round(difference, 2))}% below peers.")
+                    alerts.append(f"{label} is {abs(round(difference, 2))}% below peers.")
             elif metric in {'current_ratio', 'quick_ratio'}:
                 if difference <= -0.3:
-                    alerts.append(f"{metric.replace('_', ' ').title()} is materially weaker than peers.")
+                    alerts.append(f"{label} is materially weaker than peers.")
             elif metric in {'debt_to_asset_ratio', 'debt_to_equity_ratio'}:
                 if difference >= 10:
-                    alerts.append(f"{metric.replace('_', ' ').title()} exceeds peer leverage by {round(difference, 2)}%.")
+                    alerts.append(f"{label} exceeds peer leverage by {round(difference, 2)}%.")
         
         if not comparisons:
-            return None
+            return {}
         
         summary = self._build_summary(comparisons)
         
@@ -0,0 +1,19 @@
+"""
+Shared pytest fixtures
+"""
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def analyzer():
+    """One FinancialAnalyzer per test session"""
+    from src.analyzers.financial_analyzer import FinancialAnalyzer
+    return FinancialAnalyzer()
+
+
+@pytest.fixture
+def parser():
+    """A fresh DocumentParser per test, so its parse cache never leaks between tests"""
+    from src.parsers.document_parser import DocumentParser
+    return DocumentParser()
@@ -7,12 +7,12 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from test_data_generator import (
+    dump_json,
     generate_test_analysis_result,
     generate_multi_period_test_data
 )
 from src.analyzers.financial_analyzer import FinancialAnalyzer
 from src.utils.report_generator import ReportGenerator
-import json
 
 
 def validate_analysis_data(data: dict) -> bool:
@@ -104,11 +104,10 @@ def main():
     
     # Save test data
     print("Saving test data to files...")
-    with open('tests/test_data_1.json', 'w') as f:
-        json.dump(test_data_1, f, indent=2, default=str)
-    
-    with open('tests/test_data_2.json', 'w') as f:
-        json.dump(test_data_2, f, indent=2, default=str)
+    generator = ReportGenerator()
+    generator.queue_write('tests/test_data_1.json', dump_json(test_data_1))
+    generator.queue_write('tests/test_data_2.json', dump_json(test_data_2))
+    generator.flush_pending()
     
     print("✅ Test data saved to tests/test_data_1.json and tests/test_data_2.json")
     print()
@@ -2,15 +2,29 @@
 Unit tests for the Financial Chatbot system
 """
 
-import pytest
+import base64
 import os
 import sys
 from pathlib import Path
 
+import pytest
+
 # Add src to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from src.analyzers.financial_analyzer import FinancialAnalyzer
+# The parsers (and the chatbot built on them) need PyPDF2 and Pillow; only the
+# tests that parse documents are skipped without them
+try:
+    import PyPDF2
+    from PIL import Image
+    PARSERS_AVAILABLE = True
+except ImportError:
+    PARSERS_AVAILABLE = False
+
+if PARSERS_AVAILABLE:
+    from src.chatbot import FinancialChatbot
+    from src.parsers.enhanced_parser import EnhancedDocumentParser
+from src.utils.report_generator import ReportGenerator
 from src.utils import (
     extract_from_structured_data,
     extract_from_xbrl,
@@ -18,129 +32,148 @@ from src.utils import (
     merge_llm_structured_data,
 )
 
+requires_parsers = pytest.mark.skipif(
+    not PARSERS_AVAILABLE, reason='PyPDF2 and Pillow are required for document parsing'
+)
+
 
 class TestFinancialAnalyzer:
     """Test the financial analyzer module"""
     
-    def setup_method(self):
-        """Setup test fixtures"""
-        self.analyzer = FinancialAnalyzer()
-    
-    def test_calculate_ratios_profit_margin(self):
-        """Test profit margin calculation"""
-        financial_data = {
-            'revenue': 1000000,
-            'net_income': 100000
-        }
-        
-        ratios = self.analyzer.calculate_ratios(financial_data)
-        
-        assert 'profit_margin' in ratios
-        assert ratios['profit_margin'] == 10.0  # 100,000 / 1,000,000 * 100
-    
-    def test_calculate_ratios_roa(self):
-        """Test Return on Assets calculation"""
-        financial_data = {
-            'net_income': 50000,
-            'total_assets': 1000000
-        }
-        
-        ratios = self.analyzer.calculate_ratios(financial_data)
-        
-        assert 'roa' in ratios
-        assert ratios['roa'] == 5.0  # 50,000 / 1,000,000 * 100
-    
-    def test_calculate_ratios_debt_to_asset(self):
-        """Test Debt-to-Asset ratio calculation"""
-        financial_data = {
-            'total_assets': 1000000,
-            'total_liabilities': 600000
-        }
-        
-        ratios = self.analyzer.calculate_ratios(financial_data)
-        
-        assert 'debt_to_asset_ratio' in ratios
-        assert ratios['debt_to_asset_ratio'] == 60.0  # 600,000 / 1,000,000 * 100
-    
-    def test_assess_risks_high_leverage(self):
-        """Test risk assessment for high leverage"""
-        financial_data = {'net_income': 100000}
-        ratios = {'debt_to_asset_ratio': 70}
-        
-        risks = self.analyzer.assess_risks(financial_data, ratios)
+    @pytest.mark.parametrize('financial_data, key, expected', [
+        ({'revenue': 1000000, 'net_income': 100000}, 'profit_margin', 10.0),  # 100,000 / 1,000,000 * 100
+        ({'net_income': 50000, 'total_assets': 1000000}, 'roa', 5.0),  # 50,000 / 1,000,000 * 100
+        ({'total_assets': 1000000, 'total_liabilities': 600000}, 'debt_to_asset_ratio', 60.0),  # 600,000 / 1,000,000 * 100
+    ], ids=['profit_margin', 'roa', 'debt_to_asset'])
+    def test_calculate_ratios(self, analyzer, financial_data, key, expected):
+        """Test profit margin, ROA and debt-to-asset calculations"""
+        ratios = analyzer.calculate_ratios(financial_data)
         
-        # Should identify leverage risk
-        leverage_risks = [r for r in risks if r['type'] == 'Leverage Risk']
-        assert len(leverage_risks) > 0
-        assert leverage_risks[0]['severity'] == 'Medium'
+        assert ratios[key] == expected
     
-    def test_assess_risks_low_profitability(self):
-        """Test risk assessment for low profitability"""
-        financial_data = {'net_income': 100000}
-        ratios = {'profit_margin': 2}
-        
-        risks = self.analyzer.assess_risks(financial_data, ratios)
+    @pytest.mark.parametrize('financial_data, ratios, risk_type, severity', [
+        ({'net_income': 100000}, {'debt_to_asset_ratio': 70}, 'Leverage Risk', 'Medium'),
+        ({'net_income': 100000}, {'profit_margin': 2}, 'Profitability Risk', 'High'),
+        ({'net_income': -50000}, {}, 'Loss Risk', 'High'),
+    ], ids=['high_leverage', 'low_profitability', 'negative_income'])
+    def test_assess_risks(self, analyzer, financial_data, ratios, risk_type, severity):
+        """Test leverage, profitability and loss risk detection"""
+        risks = analyzer.assess_risks(financial_data, ratios)
         
-        # Should identify profitability risk
-        profit_risks = [r for r in risks if r['type'] == 'Profitability Risk']
-        assert len(profit_risks) > 0
-        assert profit_risks[0]['severity'] == 'High'
+        matching = [r for r in risks if r['type'] == risk_type]
+        assert len(matching) > 0
+        assert matching[0]['severity'] == severity
     
-    def test_assess_risks_negative_income(self):
-        """Test risk assessment for negative income"""
-        financial_data = {'net_income': -50000}
-        ratios = {}
-        
-        risks = self.analyzer.assess_risks(financial_data, ratios)
-        
-        # Should identify loss risk
-        loss_risks = [r for r in risks if r['type'] == 'Loss Risk']
-        assert len(loss_risks) > 0
-        assert loss_risks[0]['severity'] == 'High'
-    
-    def test_identify_trends_increasing_revenue(self):
+    def test_identify_trends_increasing_revenue(self, analyzer):
         """Test trend identification for increasing revenue"""
         historical_data = [
             {'revenue': 1000000, 'net_income': 50000},
             {'revenue': 1200000, 'net_income': 60000}
         ]
         
-        trends = self.analyzer.identify_trends(historical_data)
+        trends = analyzer.identify_trends(historical_data)
         
         assert trends['revenue_trend'] == 'increasing'
         assert trends['revenue_growth_rate'] == 20.0  # (1,200,000 - 1,000,000) / 1,000,000 * 100
     
-    def test_identify_trends_decreasing_profit(self):
+    def test_identify_trends_decreasing_profit(self, analyzer):
         """Test trend identification for decreasing profit"""
         historical_data = [
             {'revenue': 1000000, 'net_income': 100000},
             {'revenue': 1100000, 'net_income': 80000}
         ]
         
-        trends = self.analyzer.identify_trends(historical_data)
+        trends = analyzer.identify_trends(historical_data)
         
         assert trends['profit_trend'] == 'decreasing'
         assert trends['profit_growth_rate'] == -20.0  # (80,000 - 100,000) / 100,000 * 100
     
-    def test_identify_trends_insufficient_data(self):
+    def test_identify_trends_accepts_dataframe(self, analyzer):
+        """A per-period DataFrame gives the same trends as the list of dicts"""
+        import pandas as pd
+        
+        historical_data = [
+            {'period': '2022', 'revenue': 1000000, 'net_income': 50000, 'total_assets': 900000},
+            {'period': '2023', 'revenue': 0, 'sales': 1100000, 'net_income': None, 'total_assets': 950000},
+            {'revenue': 1300000, 'net_income': -20000},
+        ]
+        
+        trends = analyzer.identify_trends(pd.DataFrame(historical_data))
+        
+        assert trends == analyzer.identify_trends(historical_data)
+        assert trends['periods'] == ['2022', '2023', 'Period 3']
+        assert trends['revenue_values'] == [1000000, 1100000, 1300000]
+    
+    def test_identify_trends_insufficient_data(self, analyzer):
         """Test trend identification with insufficient data"""
         historical_data = [
             {'revenue': 1000000, 'net_income': 50000}
         ]
         
-        trends = self.analyzer.identify_trends(historical_data)
+        trends = analyzer.identify_trends(historical_data)
         
         assert 'message' in trends
         assert 'Insufficient data' in trends['message']
     
-    def test_extract_numbers(self):
+    def test_extract_numbers(self, analyzer):
         """Test number extraction from text"""
         text = "Revenue: 1,234,567.89 and expenses: 987,654.32"
-        numbers = self.analyzer._extract_numbers(text)
+        numbers = analyzer._extract_numbers(text)
         
         assert len(numbers) == 2
         assert numbers[0] == 1234567.89
         assert numbers[1] == 987654.32
+    
+    def test_extract_numbers_reads_full_width_digits(self, analyzer):
+        """Full-width digits in Chinese statements are still numbers"""
+        assert analyzer._extract_numbers("营业收入：１２３,４５６.７ 元，净利润 1234567") == [123456.7, 1234567.0]
+    
+    @pytest.mark.parametrize('financial_data', [
+        {
+            'revenue': 1000000, 'net_income': 100000, 'gross_profit': 400000,
+            'operating_income': 150000, 'total_assets': 1500000, 'total_liabilities': 750000,
+            'equity': 750000, 'current_assets': 600000, 'current_liabilities': 300000,
+            'cash': 180000, 'inventory': 180000, 'accounts_receivable': 240000,
+            'operating_cash_flow': 120000, 'interest_expense': 22500, 'free_cash_flow': 20000,
+        },
+        {},
+        {'sales': 500.0, 'net_income': -50.0, 'total_assets': 800.0, 'cash_equivalents': 40.0,
+         'current_liabilities': 100.0, 'current_assets': 120.0, 'accounts_receivable': 30.0},
+        {'revenue': 0, 'sales': 300, 'net_income': 0, 'equity': -200, 'total_assets': 100,
+         'interest_expense': 10, 'inventory': 0, 'free_cash_flow': 0},
+        {'revenue': -10.0, 'net_income': 5.0, 'total_liabilities': 0, 'total_assets': 50.0,
+         'equity': 25.0, 'interest_expense': 4.0, 'inventory': 2.5, 'free_cash_flow': -7.5},
+    ])
+    def test_ratio_kernel_matches_calculate_ratios(self, analyzer, financial_data):
+        """The array ratio kernel agrees with the dict-based calculation"""
+        import numpy as np
+        from src.analyzers.financial_analyzer import (
+            _RATIO_KEYS,
+            _ratio_inputs,
+            _ratio_kernel,
+            _ratios_from_row,
+        )
+        
+        inputs = np.array([_ratio_inputs(financial_data)])
+        out = np.empty((1, len(_RATIO_KEYS)))
+        _ratio_kernel(inputs, out)
+        
+        assert _ratios_from_row(out[0]) == analyzer.calculate_ratios(financial_data)
+    
+    @pytest.mark.parametrize('use_kernel', [False, True])
+    def test_calculate_ratios_batch_matches_single_calls(self, analyzer, monkeypatch, use_kernel):
+        """Batched ratios match calculate_ratios row by row, with or without the kernel"""
+        import src.analyzers.financial_analyzer as financial_analyzer
+        
+        monkeypatch.setattr(financial_analyzer, 'NUMBA_AVAILABLE', use_kernel)
+        batch = [
+            {'revenue': 1000.0, 'net_income': 80.0, 'total_assets': 2000.0, 'equity': 900.0},
+            {},
+            {'sales': 50.0, 'current_assets': 30.0, 'current_liabilities': 20.0, 'inventory': 5.0},
+        ]
+        
+        assert analyzer.calculate_ratios_batch(batch) == [analyzer.calculate_ratios(data) for data in batch]
+        assert analyzer.calculate_ratios_batch([]) == []
 
 
 class TestDataExtraction:
@@ -165,7 +198,156 @@ class TestDataExtraction:
         assert data['revenue'] == 1_200_000
         assert data['net_income'] == 150_000
         assert data['total_assets'] == 3_500_000
-    
+
+    def test_extract_from_structured_data_with_columnar_sheet(self):
+        parsed_doc = {
+            'type': 'excel',
+            'content': {
+                'Sheet1': {
+                    'data': {
+                        'Metric': ['Revenue', 'Net Income'],
+                        'FY2023': ['1,200,000', '150,000'],
+                    },
+                    'columns': ['Metric', 'FY2023'],
+                    'shape': (2, 2)
+                }
+            }
+        }
+        data = extract_from_structured_data(parsed_doc)
+        assert data['revenue'] == 1_200_000
+        assert data['net_income'] == 150_000
+
+    def test_extract_from_structured_data_prefers_header_matches(self):
+        parsed_doc = {
+            'type': 'csv',
+            'data': [
+                {'Metric': 'Revenue', 'FY2023': '100', 'Revenue': '500'},
+                {'Metric': 'Net Income', 'FY2023': None, 'FY2022': '40'},
+                {'Metric': 'Net Income', 'FY2023': '75'},
+            ],
+        }
+        data = extract_from_structured_data(parsed_doc)
+        # The 'Revenue' column wins over the label row even though it comes later
+        assert data['revenue'] == 500
+        # First numeric sibling is used and later rows do not overwrite it
+        assert data['net_income'] == 40
+
+    def test_large_columnar_table_matches_row_extraction(self):
+        pytest.importorskip('pandas')
+        filler = ['Depreciation', 'Other items', None, 'Amortization']
+        columns = {
+            'Metric': [filler[i % 4] for i in range(80)],
+            'FY2023': [f'{i * 1000:,}' if i % 3 else None for i in range(80)],
+            'FY2022': [i * 10 for i in range(80)],
+            'Cash': [None] * 70 + ['(2,500)'] * 10,
+        }
+        columns['Metric'][10] = 'Revenue'
+        columns['Metric'][20] = 'Net Income'
+        columns['Metric'][21] = 'Net Income'
+        columns['Metric'][30] = 'Total Assets'
+        columns['FY2023'][30] = 'n/a'
+        records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+        columnar = extract_from_structured_data({'type': 'csv', 'data': columns})
+        row_wise = extract_from_structured_data({'type': 'csv', 'data': records})
+
+        assert columnar == row_wise
+        assert columnar['revenue'] == 10_000
+        assert columnar['net_income'] == 20_000
+        assert columnar['total_assets'] == 300
+        assert columnar['cash'] == -2500
+
+    def test_bulk_numeric_column_matches_to_number(self):
+        pd = pytest.importorskip('pandas')
+        from src.utils.data_extraction import _numeric_column, _to_number
+
+        cells = ['1,200', '$3.5', '(1,000)', '12%', 'USD 7', '1e5', '-', '', ' 42 ', None, 8, '٣', 'n/a']
+        values = _numeric_column(pd.Series(cells))
+
+        expected = [_to_number(cell) for cell in cells]
+        assert [None if v != v else v for v in values.tolist()] == expected
+
+    @requires_parsers
+    def test_parse_excel_reads_all_sheets(self, tmp_path):
+        pd = pytest.importorskip('pandas')
+        pytest.importorskip('openpyxl')
+
+        file_path = tmp_path / 'statement.xlsx'
+        with pd.ExcelWriter(file_path) as writer:
+            pd.DataFrame({'Metric': ['Revenue'], 'FY2023': [1000]}).to_excel(writer, sheet_name='Income', index=False)
+            pd.DataFrame({'Metric': ['Total Assets'], 'FY2023': [5000]}).to_excel(writer, sheet_name='Balance', index=False)
+
+        parsed = EnhancedDocumentParser().parse_document(str(file_path))
+
+        assert parsed['sheets'] == ['Income', 'Balance']
+        assert parsed['content']['Income']['data'] == {'Metric': ['Revenue'], 'FY2023': [1000]}
+        data = extract_from_structured_data(parsed)
+        assert data['revenue'] == 1000
+        assert data['total_assets'] == 5000
+
+    @requires_parsers
+    def test_parse_csv_returns_columnar_data(self, tmp_path):
+        pytest.importorskip('pandas')
+
+        file_path = tmp_path / 'statement.csv'
+        file_path.write_text('Metric,FY2023\nRevenue,"1,200,000"\nNet Income,"150,000"\n')
+
+        parsed = EnhancedDocumentParser().parse_document(str(file_path))
+
+        assert parsed['data'] == {'Metric': ['Revenue', 'Net Income'], 'FY2023': ['1,200,000', '150,000']}
+        assert parsed['shape'] == (2, 2)
+        data = extract_from_structured_data(parsed)
+        assert data['revenue'] == 1_200_000
+        assert data['net_income'] == 150_000
+
+    @requires_parsers
+    def test_parse_csv_cache_returns_independent_copies(self, tmp_path):
+        pytest.importorskip('pandas')
+
+        file_path = tmp_path / 'statement.csv'
+        file_path.write_text('Metric,FY2023\nRevenue,100\n')
+        parser = EnhancedDocumentParser()
+
+        parser.parse_document(str(file_path))['data']['FY2023'][0] = 999
+        parser.parse_document(str(file_path))['data'].pop('Metric')
+
+        assert parser.parse_document(str(file_path))['data'] == {'Metric': ['Revenue'], 'FY2023': [100]}
+
+    @requires_parsers
+    def test_parse_csv_pads_ragged_rows(self, tmp_path):
+        pytest.importorskip('pandas')
+
+        file_path = tmp_path / 'statement.csv'
+        file_path.write_text('Metric,FY2023,FY2022\nRevenue,100\nNet Income,10,8\n')
+
+        parsed = EnhancedDocumentParser().parse_document(str(file_path))
+
+        assert parsed['shape'] == (2, 3)
+        assert parsed['data']['FY2023'] == [100, 10]
+        fy2022 = parsed['data']['FY2022']
+        assert fy2022[0] != fy2022[0] and fy2022[1] == 8
+        assert extract_from_structured_data(parsed)['revenue'] == 100
+
+    @requires_parsers
+    def test_parse_pdf_reports_pages_as_they_are_read(self, tmp_path):
+        file_path = tmp_path / 'statement.pdf'
+        writer = PyPDF2.PdfWriter()
+        for _ in range(3):
+            writer.add_blank_page(width=72, height=72)
+        with open(file_path, 'wb') as f:
+            writer.write(f)
+
+        parser = EnhancedDocumentParser()
+        pages = []
+        parsed = parser.parse_document(str(file_path), on_page=pages.append)
+        assert parsed['num_pages'] == 3
+        assert len(pages) == 3
+
+        # Cache hits replay the pages to the callback as well
+        replayed = []
+        parser.parse_document(str(file_path), on_page=replayed.append)
+        assert replayed == pages
+
     def test_extract_from_xbrl_maps_tags(self):
         parsed_doc = {
             'type': 'xbrl',
@@ -182,6 +364,41 @@ class TestDataExtraction:
         assert data['total_assets'] == 5_000_000
         assert data['total_liabilities'] == 2_000_000
 
+    def test_extract_from_xbrl_skips_non_numeric_matches(self):
+        parsed_doc = {
+            'type': 'xbrl',
+            'data': {
+                'RevenueRecognitionPolicy': 'Recognized on delivery',
+                'Total Revenue': '1,000',
+                'Revenues': '2,000',
+                'OperatingActivities': '(300)',
+            }
+        }
+        data = extract_from_xbrl(parsed_doc)
+        assert data['revenue'] == 1000
+        assert data['operating_cash_flow'] == -300
+        assert data['inventory'] is None
+
+    @requires_parsers
+    def test_parse_xbrl_collects_nested_facts(self, tmp_path):
+        file_path = tmp_path / 'filing.xbrl'
+        file_path.write_text(
+            '<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance" '
+            'xmlns:us-gaap="http://fasb.org/us-gaap/2023">'
+            '<xbrli:context id="c1"><xbrli:entity><xbrli:identifier>ACME</xbrli:identifier></xbrli:entity></xbrli:context>'
+            '<us-gaap:Revenues contextRef="c1">2500000</us-gaap:Revenues>'
+            '<us-gaap:NetIncomeLoss contextRef="c1">250000</us-gaap:NetIncomeLoss>'
+            '</xbrli:xbrl>'
+        )
+
+        parsed = EnhancedDocumentParser().parse_document(str(file_path))
+
+        assert parsed['data'] == {
+            'identifier': 'ACME',
+            'Revenues': '2500000',
+            'NetIncomeLoss': '250000',
+        }
+
     def test_merge_llm_structured_data_updates_metrics(self):
         base = {}
         structured = {
@@ -203,6 +420,53 @@ class TestDataExtraction:
         assert metadata['period_label'] == 'FY2023'
         assert notes == ['LLM detected audited figures.']
 
+    def test_match_keyword_keeps_field_priority(self):
+        from src.utils.data_extraction import _match_keyword
+
+        # 'net sales' appears first in the text, but revenue is listed first in KEYWORD_MAP
+        assert _match_keyword('Net sales revenue') == 'revenue'
+        assert _match_keyword('  Total Current Liabilities ') == 'current_liabilities'
+        assert _match_keyword('Depreciation') is None
+
+    def test_to_number_handles_formatted_cells(self):
+        from src.utils.data_extraction import _to_number
+
+        assert _to_number('$1,200,000') == 1_200_000
+        assert _to_number('(1,000)') == -1000
+        assert _to_number('12.5%') == 12.5
+        assert _to_number('USD 3,000') == 3000
+        assert _to_number('n/a') is None
+        assert _to_number('-') is None
+        assert _to_number('5 000') == 5000
+        # Letters are stripped rather than parsed, so exponents and inf are not special
+        assert _to_number('1e5') == 15
+        assert _to_number('inf') is None
+        assert _to_number(float('inf')) is None
+
+
+class TestUtilsPackage:
+    """Test the lazy src.utils package exports"""
+    
+    def test_utils_exports_load_on_first_access(self):
+        import subprocess
+        
+        code = (
+            "import sys\n"
+            "import src.utils.cache\n"
+            "assert 'src.utils.data_extraction' not in sys.modules\n"
+            "from src.utils import PeerBenchmark, extract_from_xbrl\n"
+            "import src.utils.data_extraction as data_extraction\n"
+            "assert extract_from_xbrl is data_extraction.extract_from_xbrl\n"
+        )
+        root = os.path.join(os.path.dirname(__file__), '..')
+        subprocess.run([sys.executable, '-c', code], cwd=root, check=True)
+    
+    def test_utils_unknown_attribute_raises(self):
+        import src.utils
+        
+        with pytest.raises(AttributeError):
+            src.utils.not_a_helper
+
 
 class TestPeerBenchmark:
     """Test peer benchmarking helper"""
@@ -221,34 +485,172 @@ class TestPeerBenchmark:
         assert any(m['metric'] == 'profit_margin' for m in result['metrics'])
         assert any('debt to asset' in alert.lower() for alert in result.get('alerts', []))
 
+    def test_peer_benchmark_caches_comparisons(self, monkeypatch):
+        benchmark = PeerBenchmark()
+        ratios = {'profit_margin': 2.0, 'roe': 20.0, 'unrelated_metric': 1.0}
+        first = benchmark.compare({}, ratios, industry='Technology')
+
+        def fail(*args, **kwargs):
+            raise AssertionError('comparison should come from the cache')
 
+        monkeypatch.setattr(benchmark, '_compare', fail)
+        # Ratios that are not benchmarked do not affect the cache key
+        second = benchmark.compare({}, {**ratios, 'unrelated_metric': 9.0}, industry='technology ')
+        assert second == first
+        assert second is not first
+
+        second['alerts'].append('changed by caller')
+        assert benchmark.compare({}, ratios, industry='technology') == first
+        assert 'Profit Margin is 10.0% below peers.' in first['alerts']
+
+
+class TestReportGenerator:
+    """Test report rendering"""
+    
+    def test_markdown_report_renders_sections(self):
+        report = ReportGenerator().generate_markdown_report({
+            'financial_data': {'revenue': 1234567.891, 'net_income': 0.5, 'equity': None},
+            'ratios': {'profit_margin': 12.345, 'current_ratio': 1.5},
+            'risks': [{'type': 'High Leverage', 'severity': 'High', 'description': 'Too much debt'}],
+            'dupont': {'roe': 15.0, 'profit_margin': 10.0, 'asset_turnover': 0.8, 'equity_multiplier': 1.9},
+        })
+        
+        assert '| Revenue | $1,234,567.89 |\n' in report
+        assert '| Net Income | $0.50 |\n' in report
+        assert '| Equity |' not in report
+        assert '| Profit Margin | 12.35% |\n' in report
+        assert '| Current Ratio | 1.50 |\n' in report
+        assert '- **Equity Multiplier:** 1.90x\n' in report
+        assert '### 🔴 High Leverage\n\n' in report
+        assert '- Address High Leverage: Too much debt\n' in report
+        assert report.endswith('Financial Statement AI Analyzer.*\n')
+    
+    def test_text_report_renders_sections(self):
+        report = ReportGenerator().generate_text_report({
+            'financial_data': {'total_assets': 2500.0, 'company_name': 'Acme'},
+            'ratios': {'roe': 8.0, 'asset_turnover': 1.25, 'current_ratio': 1.5},
+            'trends': {'revenue_trend': 'increasing'},
+        })
+        
+        assert 'Total Assets: $2,500.00\n' in report
+        assert 'Company Name: Acme\n' in report
+        assert 'Roe: 8.00%\n' in report
+        assert 'Asset Turnover: 1.25x\n' in report
+        assert 'Current Ratio: 1.50\n' in report
+        assert 'Revenue Trend: increasing\n' in report
+        assert 'RISK ASSESSMENT' not in report
+        assert report.endswith('End of Report\n' + '=' * 60 + '\n')
+    
+    def test_text_report_includes_benchmark(self):
+        report = ReportGenerator().generate_text_report({
+            'benchmark': {
+                'industry': 'Technology',
+                'summary': 'Below peers on margins.',
+                'metrics': [{'metric': 'profit_margin', 'company': 2.0, 'benchmark': 12.0, 'difference': -10.0}],
+                'alerts': ['Profit Margin is 10.0% below peers.'],
+            },
+        })
+        
+        assert 'PEER BENCHMARKING\n' + '-' * 60 + '\nIndustry: Technology\nBelow peers on margins.\n' in report
+        assert 'Profit Margin: Company=2.0 Benchmark=12.0 Δ=-10.0\n' in report
+        assert '  Alert: Profit Margin is 10.0% below peers.\n' in report
+    
+    def test_report_files_are_written_immediately(self, tmp_path):
+        generator = ReportGenerator()
+        md_path = tmp_path / 'report.md'
+        
+        markdown = generator.generate_markdown_report({}, filename=str(md_path))
+        
+        assert md_path.read_text(encoding='utf-8') == markdown
+        assert generator.flush_pending() == []
+    
+    def test_batched_report_files_are_written_on_exit(self, tmp_path):
+        generator = ReportGenerator()
+        md_path = tmp_path / 'report.md'
+        txt_path = tmp_path / 'report.txt'
+        
+        with generator.batched():
+            markdown = generator.generate_markdown_report({}, filename=str(md_path))
+            text = generator.generate_text_report({}, filename=str(txt_path))
+            generator.queue_write(str(tmp_path / 'data.json'), b'{}')
+            assert not md_path.exists()
+        
+        assert md_path.read_text(encoding='utf-8') == markdown
+        assert txt_path.read_text(encoding='utf-8') == text
+        assert (tmp_path / 'data.json').read_bytes() == b'{}'
+        assert generator.flush_pending() == []
+
+
+@requires_parsers
 class TestDocumentParser:
     """Test the document parser module"""
     
-    def setup_method(self):
-        """Setup test fixtures"""
-        from src.parsers.document_parser import DocumentParser
-        self.parser = DocumentParser()
-    
-    def test_supported_formats(self):
+    def test_supported_formats(self, parser):
         """Test supported file formats"""
-        assert '.pdf' in self.parser.supported_formats
-        assert '.png' in self.parser.supported_formats
-        assert '.jpg' in self.parser.supported_formats
-        assert '.jpeg' in self.parser.supported_formats
+        assert '.pdf' in parser.supported_formats
+        assert '.png' in parser.supported_formats
+        assert '.jpg' in parser.supported_formats
+        assert '.jpeg' in parser.supported_formats
     
-    def test_unsupported_format_raises_error(self):
+    def test_unsupported_format_raises_error(self, parser):
         """Test that unsupported formats raise an error"""
         with pytest.raises(ValueError, match="Unsupported file format"):
-            self.parser.parse_document("test.docx")
+            parser.parse_document("test.docx")
 
+    def test_parse_image_keeps_original_bytes(self, parser, tmp_path):
+        """Test that PNG/JPEG uploads are base64-encoded without re-encoding"""
 
+        file_path = tmp_path / 'scan.png'
+        Image.new('RGB', (4, 3), 'white').save(file_path, format='PNG')
+
+        parsed = parser.parse_document(str(file_path))
+
+        assert parsed['format'] == 'PNG'
+        assert parsed['size'] == (4, 3)
+        assert base64.b64decode(parsed['base64']) == file_path.read_bytes()
+
+    def test_parse_document_caches_by_content(self, parser, tmp_path, monkeypatch):
+        """Test that re-uploading identical bytes reuses the cached parse"""
+
+        first = tmp_path / 'first.png'
+        Image.new('RGB', (2, 2), 'black').save(first, format='PNG')
+        second = tmp_path / 'second.png'
+        second.write_bytes(first.read_bytes())
+
+        calls = []
+        original = parser._parse_image
+        monkeypatch.setattr(parser, '_parse_image', lambda path: calls.append(path) or original(path))
+
+        parsed_first = parser.parse_document(str(first))
+        parsed_second = parser.parse_document(str(second))
+
+        assert calls == [str(first)]
+        assert parsed_second['base64'] == parsed_first['base64']
+        assert parsed_second['file_path'] == str(second)
+
+    def test_cached_parse_is_not_shared_with_callers(self, parser, tmp_path):
+        """Test that editing a returned parse does not change later parses"""
+        file_path = tmp_path / 'statement.pdf'
+        writer = PyPDF2.PdfWriter()
+        writer.add_blank_page(width=72, height=72)
+        with open(file_path, 'wb') as f:
+            writer.write(f)
+
+        first = parser.parse_document(str(file_path))
+        first['content'][0]['text'] = 'edited'
+        first['content'].append({'page': 2, 'text': 'extra'})
+        second = parser.parse_document(str(file_path))
+        second['content'].clear()
+
+        assert parser.parse_document(str(file_path))['content'] == [{'page': 1, 'text': ''}]
+
+
+@requires_parsers
 class TestChatbotIntegration:
     """Integration tests for the chatbot"""
     
     def test_chatbot_initialization(self):
         """Test chatbot can be initialized"""
-        from src.chatbot import FinancialChatbot
         
         # Should not raise any errors even without API key
         chatbot = FinancialChatbot()
@@ -260,7 +662,6 @@ class TestChatbotIntegration:
     
     def test_chatbot_reset(self):
         """Test chatbot reset functionality"""
-        from src.chatbot import FinancialChatbot
         
         chatbot = FinancialChatbot()
         chatbot.analysis_results = {'test': 'data'}
@@ -270,6 +671,14 @@ class TestChatbotIntegration:
         assert chatbot.current_document is None
         assert chatbot.analysis_results == {}
 
+    
+    def test_chatbot_streams_prompt_before_analysis(self):
+        """Streaming Q&A reports the missing analysis instead of calling the LLM"""
+        
+        chatbot = FinancialChatbot()
+        
+        assert ''.join(chatbot.ask_question_stream('Revenue?')) == chatbot.ask_question('Revenue?')
+
 
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -2,23 +2,39 @@
 Generate test data for financial statement analysis
 """
 
+import functools
 import json
-from typing import Dict, Any
+import os
+from types import MappingProxyType
+from typing import Dict, Any, List, Mapping, Tuple, Union
 
+import numpy as np
+import pandas as pd
 
-def generate_test_financial_data(company_name: str = "Test Company", period: str = "2024") -> Dict[str, Any]:
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    pq = None
+    PYARROW_AVAILABLE = False
+
+def _derive(revenue: float) -> Dict[str, Any]:
     """
-    Generate realistic test financial data
+    Derive a full set of statement line items from revenue
     
     Args:
-        company_name: Name of the company
-        period: Period identifier
+        revenue: Revenue for the period
         
     Returns:
-        Dictionary with financial data
+        Dictionary with financial data scaled to a healthy company profile
     """
-    # Base values for a healthy company
-    revenue = 10000000
     gross_profit = revenue * 0.4  # 40% gross margin
     operating_income = revenue * 0.15  # 15% operating margin
     net_income = revenue * 0.10  # 10% net margin
@@ -42,8 +58,6 @@ def generate_test_financial_data(company_name: str = "Test Company", period: str
     interest_expense = total_debt * 0.05
     
     return {
-        'company_name': company_name,
-        'period': period,
         'revenue': revenue,
         'sales': revenue,
         'gross_profit': gross_profit,
@@ -67,23 +81,33 @@ def generate_test_financial_data(company_name: str = "Test Company", period: str
     }
 
 
-def generate_test_analysis_result(company_name: str = "Test Company", period: str = "2024") -> Dict[str, Any]:
+# Line items of the default single-period company, computed once at import
+BASE_REVENUE = 10000000
+_BASE_FINANCIAL_TEMPLATE = MappingProxyType(_derive(BASE_REVENUE))
+
+
+@functools.lru_cache(maxsize=128)
+def generate_test_financial_data(company_name: str = "Test Company", period: str = "2024",
+                                 revenue: float = BASE_REVENUE) -> Mapping[str, Any]:
     """
-    Generate complete test analysis result
+    Generate realistic test financial data
+    
+    Results are cached per arguments; copy with dict() before mutating.
     
     Args:
         company_name: Name of the company
         period: Period identifier
+        revenue: Revenue every other line item is derived from
         
     Returns:
-        Complete analysis result dictionary
+        Read-only mapping with financial data
     """
-    from src.analyzers.financial_analyzer import FinancialAnalyzer
-    
-    analyzer = FinancialAnalyzer()
-    financial_data = generate_test_financial_data(company_name, period)
-    
-    ratios = analyzer.calculate_ratios(financial_data)
+    line_items = _BASE_FINANCIAL_TEMPLATE if revenue == BASE_REVENUE else _derive(revenue)
+    return MappingProxyType({'company_name': company_name, 'period': period, **line_items})
+
+
+def _single_period_result(analyzer, company_name: str, period: str,
+                          financial_data: Dict[str, Any], ratios: Dict[str, float]) -> Dict[str, Any]:
     risks = analyzer.assess_risks(financial_data, ratios)
     dupont = analyzer.calculate_dupont_analysis(financial_data, ratios)
     
@@ -99,39 +123,36 @@ def generate_test_analysis_result(company_name: str = "Test Company", period: st
     }
 
 
-def generate_multi_period_test_data(company_name: str = "Test Company", periods: int = 3) -> Dict[str, Any]:
+def generate_test_financial_dataframe(company_name: str = "Test Company", periods: int = 3) -> pd.DataFrame:
     """
-    Generate multi-period test data for trend analysis
+    Generate multi-period test financial data as a DataFrame
     
     Args:
         company_name: Name of the company
         periods: Number of periods to generate
         
     Returns:
-        Analysis result with trend data
+        DataFrame with one row per period and one float column per metric
     """
-    from src.analyzers.financial_analyzer import FinancialAnalyzer
-    
-    analyzer = FinancialAnalyzer()
-    historical_data = []
-    
-    base_revenue = 10000000
     growth_rate = 0.15  # 15% annual growth
     
-    for i in range(periods):
-        period = f"202{4-i}" if periods <= 3 else f"202{4-i}"
-        revenue = base_revenue * ((1 + growth_rate) ** (periods - 1 - i))
-        
-        financial_data = generate_test_financial_data(company_name, period)
-        financial_data['revenue'] = revenue
-        financial_data['net_income'] = revenue * 0.10
-        financial_data['total_assets'] = revenue * 1.5
-        
-        historical_data.append(financial_data)
-    
+    revenues = BASE_REVENUE * (1 + growth_rate) ** np.arange(periods - 1, -1, -1)
+    # _derive only does arithmetic, so it fills every column in one pass over the array
+    return pd.DataFrame({
+        'company_name': company_name,
+        'period': [f"202{4-i}" for i in range(periods)],
+        **_derive(revenues),
+    })
+
+
+def _multi_period_history(company_name: str, periods: int) -> List[Dict[str, Any]]:
+    return generate_test_financial_dataframe(company_name, periods).to_dict('records')
+
+
+def _multi_period_result(analyzer, company_name: str, historical_data: List[Dict[str, Any]],
+                         ratios: Dict[str, float]) -> Dict[str, Any]:
     # Use latest period for main analysis
     latest_data = historical_data[-1]
-    ratios = analyzer.calculate_ratios(latest_data)
     risks = analyzer.assess_risks(latest_data, ratios)
     dupont = analyzer.calculate_dupont_analysis(latest_data, ratios)
     trends = analyzer.identify_trends(historical_data)
@@ -149,24 +170,153 @@ def generate_multi_period_test_data(company_name: str = "Test Company", periods:
     }
 
 
-if __name__ == "__main__":
-    # Generate and save test data
-    test_data_1 = generate_test_analysis_result("TechCorp Inc", "2024")
-    test_data_2 = generate_test_analysis_result("Manufacturing Co", "2024")
-    test_data_3 = generate_multi_period_test_data("Growth Industries", 3)
+def generate_test_analysis_result(company_name: str = "Test Company", period: str = "2024") -> Dict[str, Any]:
+    """
+    Generate complete test analysis result
+    
+    Args:
+        company_name: Name of the company
+        period: Period identifier
+        
+    Returns:
+        Complete analysis result dictionary
+    """
+    from src.analyzers.financial_analyzer import FinancialAnalyzer
+    
+    analyzer = FinancialAnalyzer()
+    financial_data = dict(generate_test_financial_data(company_name, period))
+    ratios = analyzer.calculate_ratios(financial_data)
+    return _single_period_result(analyzer, company_name, period, financial_data, ratios)
+
+
+def generate_multi_period_test_data(company_name: str = "Test Company", periods: int = 3) -> Dict[str, Any]:
+    """
+    Generate multi-period test data for trend analysis
+    
+    Args:
+        company_name: Name of the company
+        periods: Number of periods to generate
+        
+    Returns:
+        Analysis result with trend data
+    """
+    from src.analyzers.financial_analyzer import FinancialAnalyzer
     
-    # Save to JSON files
-    with open('tests/test_data_1.json', 'w') as f:
-        json.dump(test_data_1, f, indent=2, default=str)
+    analyzer = FinancialAnalyzer()
+    historical_data = _multi_period_history(company_name, periods)
+    ratios = analyzer.calculate_ratios(historical_data[-1])
+    return _multi_period_result(analyzer, company_name, historical_data, ratios)
+
+
+def _build_batch(specs: List[Tuple[str, Union[str, int]]]) -> List[Dict[str, Any]]:
+    """
+    Generate several analysis results with one batched ratio calculation
     
-    with open('tests/test_data_2.json', 'w') as f:
-        json.dump(test_data_2, f, indent=2, default=str)
+    Args:
+        specs: (company_name, period) for single-period results, or
+            (company_name, periods) with an int period count for multi-period ones
+        
+    Returns:
+        Analysis results in the same order as ``specs``
+    """
+    from src.analyzers.financial_analyzer import FinancialAnalyzer
     
-    with open('tests/test_data_3.json', 'w') as f:
-        json.dump(test_data_3, f, indent=2, default=str)
+    analyzer = FinancialAnalyzer()
+    histories = [
+        _multi_period_history(company_name, arg) if isinstance(arg, int)
+        else [dict(generate_test_financial_data(company_name, arg))]
+        for company_name, arg in specs
+    ]
+    all_ratios = analyzer.calculate_ratios_batch([history[-1] for history in histories])
     
-    print("Test data generated successfully!")
-    print(f"- test_data_1.json: Single period analysis for TechCorp Inc")
-    print(f"- test_data_2.json: Single period analysis for Manufacturing Co")
-    print(f"- test_data_3.json: Multi-period analysis for Growth Industries")
+    return [
+        _multi_period_result(analyzer, company_name, history, ratios) if isinstance(arg, int)
+        else _single_period_result(analyzer, company_name, arg, history[-1], ratios)
+        for (company_name, arg), history, ratios in zip(specs, histories, all_ratios)
+    ]
+
+
+def dump_json(data: Dict[str, Any]) -> bytes:
+    """Serialize test data as indented UTF-8 JSON (orjson when available)"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2, default=str)
+    return json.dumps(data, indent=2, default=str).encode('utf-8')
 
+
+def _load_json(payload: bytes) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def save_test_data(name: str, data: Dict[str, Any], directory: str = os.curdir) -> str:
+    """
+    Save generated test data under ``directory``
+    
+    Results with ``historical_data`` are stored as a zstd Parquet table of the
+    periods (one column per metric) when pyarrow is installed, with the rest of
+    the analysis kept as JSON in the schema metadata. Everything else is JSON.
+    
+    Args:
+        name: File name without extension
+        data: Analysis result to save
+        directory: Target directory (defaults to the current directory)
+        
+    Returns:
+        Path of the written file
+    """
+    if PYARROW_AVAILABLE and data.get('historical_data'):
+        analysis = {key: value for key, value in data.items() if key != 'historical_data'}
+        table = pa.Table.from_pylist(data['historical_data'])
+        table = table.replace_schema_metadata({'analysis': dump_json(analysis)})
+        path = os.path.join(directory, f'{name}.parquet')
+        pq.write_table(table, path, compression='zstd')
+        return path
+    
+    path = os.path.join(directory, f'{name}.json')
+    with open(path, 'wb') as f:
+        f.write(dump_json(data))
+    return path
+
+
+def load_test_data(name: str, directory: str = os.curdir) -> Dict[str, Any]:
+    """
+    Load test data written by save_test_data (Parquet first, then JSON)
+    
+    Args:
+        name: File name without extension
+        directory: Directory holding the file
+        
+    Returns:
+        Analysis result dictionary
+    """
+    parquet_path = os.path.join(directory, f'{name}.parquet')
+    if PYARROW_AVAILABLE and os.path.exists(parquet_path):
+        table = pq.read_table(parquet_path)
+        data = _load_json(table.schema.metadata[b'analysis'])
+        data['historical_data'] = table.to_pylist()
+        return data
+    
+    with open(os.path.join(directory, f'{name}.json'), 'rb') as f:
+        return _load_json(f.read())
+
+
+if __name__ == "__main__":
+    # Generate and save test data; the names differ from the committed
+    # test_data_N.json fixtures so those are never overwritten
+    test_data_1, test_data_2, test_data_3 = _build_batch([
+        ("TechCorp Inc", "2024"),
+        ("Manufacturing Co", "2024"),
+        ("Growth Industries", 3),
+    ])
+    
+    paths = [
+        save_test_data('generated_test_data_1', test_data_1),
+        save_test_data('generated_test_data_2', test_data_2),
+        save_test_data('generated_test_data_3', test_data_3),
+    ]
+    
+    print("Test data generated successfully!")
+    print(f"- {os.path.basename(paths[0])}: Single period analysis for TechCorp Inc")
+    print(f"- {os.path.basename(paths[1])}: Single period analysis for Manufacturing Co")
+    print(f"- {os.path.basename(paths[2])}: Multi-period analysis for Growth Industries")
@@ -1,3 +1,7 @@
+import asyncio
+import json
+import threading
+
 import pytest
 
 import src.llm.financial_llm as financial_llm
@@ -12,33 +16,64 @@ def clear_env(monkeypatch):
         "DASHSCOPE_API_KEY",
     ]:
         monkeypatch.delenv(key, raising=False)
+    financial_llm._shared_client.cache_clear()
+    yield
+    financial_llm._shared_client.cache_clear()
 
 
-@pytest.fixture
-def fake_tongyi(monkeypatch):
-    state = {
-        "response_text": "ok",
-        "calls": [],
-    }
-
-    class FakeClient:
-        def __init__(self, api_key, base_url=None, model=None):
-            self.api_key = api_key
-            self.base_url = base_url
-            self.model = model
-
-        def create_chat_completion(self, **kwargs):
-            state["calls"].append(kwargs)
-            return {"choices": [{"message": {"content": state["response_text"]}}]}
+class FakeClient:
+    # Shared call log and canned responses, set by the fixtures below
+    state = None
+
+    def __init__(self, api_key, base_url=None, model=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+
+    def create_chat_completion(self, **kwargs):
+        self.state["calls"].append(kwargs)
+        return {"choices": [{"message": {"content": self.state["response_text"]}}]}
+
+    def stream_chat_completion(self, **kwargs):
+        self.state["calls"].append(kwargs)
+        yield from self.state.get("stream_chunks") or [self.state["response_text"]]
+
 
+@pytest.fixture(scope="module")
+def tongyi_state():
+    return {"response_text": "ok", "calls": []}
+
+
+@pytest.fixture
+def fake_tongyi(monkeypatch, tongyi_state):
+    tongyi_state.clear()
+    tongyi_state.update(response_text="ok", calls=[])
+    monkeypatch.setattr(FakeClient, "state", tongyi_state)
     monkeypatch.setattr(financial_llm, "TongyiClient", FakeClient)
-    return state
+    return tongyi_state
+
+
+@pytest.fixture(scope="module")
+def shared_llm(tongyi_state):
+    # Build once with the fake client; the patches only need to last for __init__
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(FakeClient, "state", tongyi_state)
+        mp.setattr(financial_llm, "TongyiClient", FakeClient)
+        mp.setenv("TONGYI_API_KEY", "key")
+        llm = financial_llm.FinancialLLM()
+    financial_llm._shared_client.cache_clear()
+    return llm
 
 
-def test_generate_financial_insights(monkeypatch, fake_tongyi):
+@pytest.fixture
+def llm(shared_llm, fake_tongyi):
+    shared_llm.reset_conversation()
+    shared_llm.response_cache.clear()
+    return shared_llm
+
+
+def test_generate_financial_insights(llm, fake_tongyi):
     fake_tongyi["response_text"] = "insights"
-    monkeypatch.setenv("TONGYI_API_KEY", "key")
-    llm = financial_llm.FinancialLLM()
 
     result = llm.generate_financial_insights(
         {"revenue": 1_000_000},
@@ -50,10 +85,8 @@ def test_generate_financial_insights(monkeypatch, fake_tongyi):
     assert fake_tongyi["calls"]
 
 
-def test_answer_question_maintains_history(monkeypatch, fake_tongyi):
+def test_answer_question_maintains_history(llm, fake_tongyi):
     fake_tongyi["response_text"] = "answer"
-    monkeypatch.setenv("TONGYI_API_KEY", "key")
-    llm = financial_llm.FinancialLLM()
 
     context = {"financial_data": {"revenue": 10}, "ratios": {}, "risks": [], "trends": {}}
     out = llm.answer_question("Q?", context, user_id="user-1")
@@ -66,28 +99,477 @@ def test_answer_question_maintains_history(monkeypatch, fake_tongyi):
     ]
 
 
-def test_generate_summary(monkeypatch, fake_tongyi):
+def test_generate_summary(llm, fake_tongyi):
     fake_tongyi["response_text"] = "summary"
-    monkeypatch.setenv("TONGYI_API_KEY", "key")
-    llm = financial_llm.FinancialLLM()
 
     assert llm.generate_summary("doc text") == "summary"
 
 
-def test_extract_structured_data(monkeypatch, fake_tongyi):
+def test_extract_structured_data(llm, fake_tongyi):
     fake_tongyi["response_text"] = '{"revenue": 100, "net_income": 50}'
-    monkeypatch.setenv("TONGYI_API_KEY", "key")
-    llm = financial_llm.FinancialLLM()
 
     data = llm.extract_structured_data("Revenue was 100 and profit 50", period_hint="FY23")
     assert data["metrics"]["revenue"] == 100
     assert data["metrics"]["net_income"] == 50
     assert data["metadata"] == {}
 
+    messages = fake_tongyi["calls"][-1]["messages"]
+    assert '"period_label": "FY2023"' in messages[0]["content"]
+    assert messages[0]["content"].startswith("You are a forensic accountant")
+    assert messages[1]["content"].startswith("Document excerpt:\nRevenue was 100 and profit 50")
+    assert "Period hint: FY23" in messages[1]["content"]
 
-def test_analyze_document_with_vision_not_supported(monkeypatch, fake_tongyi):
-    monkeypatch.setenv("TONGYI_API_KEY", "key")
-    llm = financial_llm.FinancialLLM()
 
+def test_analyze_document_with_vision_not_supported(llm):
     with pytest.raises(NotImplementedError):
         llm.analyze_document_with_vision("base64")
+
+
+def test_tongyi_client_posts_serialized_payload(monkeypatch):
+    captured = {}
+
+    class FakeResponse:
+        status_code = 200
+        text = ""
+        content = b'{"choices": [{"message": {"content": "hi"}}]}'
+
+    def fake_post(url, **kwargs):
+        captured["url"] = url
+        captured.update(kwargs)
+        return FakeResponse()
+
+    client = financial_llm.TongyiClient(api_key="key")
+    monkeypatch.setattr(client.session, "post", fake_post)
+
+    response = client.create_chat_completion(messages=[{"role": "user", "content": "Hi"}])
+
+    assert captured["url"].endswith("/chat/completions")
+    assert json.loads(captured["data"])["messages"] == [{"role": "user", "content": "Hi"}]
+    assert response["choices"][0]["message"]["content"] == "hi"
+
+
+def test_safe_json_loads_extracts_embedded_object(llm):
+    assert llm._safe_json_loads('Here you go: {"revenue": 1} done') == {"revenue": 1}
+    assert llm._safe_json_loads("not json") == {}
+
+
+def test_format_dict_rounds_floats(llm):
+    formatted = llm._format_dict({"profit_margin": 12.345678, "revenue": 1250000.0, "period": "FY23"})
+
+    assert formatted == "  - period: FY23\n  - profit_margin: 12.35\n  - revenue: 1,250,000.00"
+    assert llm._format_dict({}) == "  - None"
+
+
+def test_history_is_bounded(llm):
+    for i in range(100):
+        llm._update_history("user-1", "user" if i % 2 == 0 else "assistant", f"message {i}")
+
+    assert len(llm.conversation_histories["user-1"]) == financial_llm.HISTORY_MAX_MESSAGES
+    history = llm._get_history("user-1")
+    assert [m["content"] for m in history] == [f"message {i}" for i in range(36, 100)]
+    assert llm._get_history("unknown") == []
+
+
+def test_history_window_follows_token_budget(llm, monkeypatch):
+    monkeypatch.setattr(financial_llm, "_token_encoding", lambda: None)
+    monkeypatch.setattr(financial_llm, "HISTORY_TOKEN_BUDGET", 35)
+
+    # 40 ASCII characters count as 10 tokens each
+    for i in range(6):
+        llm._update_history("user-1", "user" if i % 2 == 0 else "assistant", f"{i}" * 40)
+
+    # Three messages fit, but the window must not open on an answer
+    assert [m["content"][0] for m in llm._get_history("user-1")] == ["4", "5"]
+
+    llm._update_history("user-1", "user", "6" * 200)
+    assert llm._get_history("user-1") == []
+
+
+def test_token_bucket_waits_when_empty():
+    now = [0.0]
+    sleeps = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = financial_llm._TokenBucket(60, clock=lambda: now[0], sleep=fake_sleep)
+    for _ in range(60):
+        bucket.acquire()
+    assert sleeps == []
+
+    bucket.acquire()
+    assert sleeps == [pytest.approx(1.0)]
+
+
+def test_circuit_breaker_short_circuits_after_server_errors(monkeypatch):
+    calls = []
+
+    class FakeResponse:
+        status_code = 503
+        text = "unavailable"
+        content = b""
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    responses = []
+
+    def fake_post(url, **kwargs):
+        calls.append(url)
+        responses.append(FakeResponse())
+        return responses[-1]
+
+    client = financial_llm.TongyiClient(api_key="key")
+    monkeypatch.setattr(client.session, "post", fake_post)
+
+    for _ in range(client.circuit_breaker.fail_max):
+        with pytest.raises(RuntimeError, match="503"):
+            client.create_chat_completion(messages=[{"role": "user", "content": "Hi"}])
+
+    with pytest.raises(RuntimeError, match="failing repeatedly"):
+        client.create_chat_completion(messages=[{"role": "user", "content": "Hi"}])
+    assert len(calls) == client.circuit_breaker.fail_max
+    assert all(response.closed for response in responses)
+
+
+def test_circuit_breaker_probe_reports_back_on_any_error(monkeypatch):
+    client = financial_llm.TongyiClient(api_key="key")
+    breaker = client.circuit_breaker
+    now = [0.0]
+    monkeypatch.setattr(breaker, "_clock", lambda: now[0])
+    for _ in range(breaker.fail_max):
+        breaker.record_failure()
+    now[0] = breaker.reset_timeout + 1
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(client.rate_limiter, "acquire", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        client.create_chat_completion(messages=[{"role": "user", "content": "Hi"}])
+
+    assert not breaker.half_open
+    assert breaker.opened_at == now[0]
+
+
+def test_circuit_breaker_does_not_close_on_throttling(monkeypatch):
+    class FakeResponse:
+        status_code = 429
+        text = "slow down"
+
+        def close(self):
+            pass
+
+    client = financial_llm.TongyiClient(api_key="key")
+    breaker = client.circuit_breaker
+    monkeypatch.setattr(client.session, "post", lambda url, **kwargs: FakeResponse())
+    breaker.record_failure()
+
+    with pytest.raises(RuntimeError, match="429"):
+        client.create_chat_completion(messages=[{"role": "user", "content": "Hi"}])
+
+    assert breaker.failures == 2
+
+
+def test_circuit_breaker_allows_a_single_half_open_probe():
+    now = [0.0]
+    breaker = financial_llm._CircuitBreaker(fail_max=1, reset_timeout=10.0, clock=lambda: now[0])
+    breaker.record_failure()
+
+    now[0] = 11.0
+    breaker.before_call()
+    # Other callers are rejected while the probe is in flight
+    with pytest.raises(RuntimeError, match="probe"):
+        breaker.before_call()
+
+    # A failed probe reopens the breaker for another full timeout
+    breaker.record_failure()
+    now[0] = 15.0
+    with pytest.raises(RuntimeError, match="skipping request"):
+        breaker.before_call()
+
+    now[0] = 22.0
+    breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_extract_structured_data_reads_pages_lazily(llm, fake_tongyi):
+    fake_tongyi["response_text"] = '{"metrics": {"revenue": 100}}'
+    consumed = []
+
+    def pages():
+        for i in range(100):
+            consumed.append(i)
+            yield "x" * 2500
+
+    llm.extract_structured_data(pages())
+
+    assert consumed == [0, 1, 2]
+    user_prompt = fake_tongyi["calls"][-1]["messages"][1]["content"]
+    assert "x" * 2500 + "\n" + "x" * 2500 + "\n" + "x" * 998 + "\n\nPeriod hint" in user_prompt
+
+
+def test_take_chars_matches_join_slice():
+    pages = ["alpha", "", "beta", "gamma"]
+    for limit in range(0, 25):
+        assert financial_llm._take_chars(iter(pages), limit) == "\n".join(pages)[:limit]
+    assert financial_llm._take_chars("abcdef", 3) == "abc"
+
+
+def test_instances_share_client_per_credentials(monkeypatch, fake_tongyi):
+    monkeypatch.setenv("TONGYI_API_KEY", "key")
+
+    first = financial_llm.FinancialLLM()
+    second = financial_llm.FinancialLLM()
+    other = financial_llm.FinancialLLM(api_key="other-key")
+
+    assert first.client is second.client
+    assert other.client is not first.client
+
+
+def test_safe_json_loads_ignores_non_object_payloads(llm, fake_tongyi):
+    assert llm._safe_json_loads("[1, 2, 3]") == {}
+    fake_tongyi["response_text"] = "[1, 2, 3]"
+    assert llm.extract_structured_data("Revenue 100") == {}
+
+
+def test_fit_tokens_trims_to_budget():
+    ascii_text = "revenue " * 2000
+    cjk_text = "营业收入" * 2000
+
+    for text in (ascii_text, cjk_text, ascii_text + cjk_text):
+        fitted = financial_llm._fit_tokens(text, 500)
+        assert text.startswith(fitted)
+        assert financial_llm._count_tokens(fitted) <= 500
+    assert financial_llm._fit_tokens("short", 500) == "short"
+    assert financial_llm._fit_tokens("short", 0) == ""
+
+
+def test_extraction_excerpt_respects_token_budget(llm, monkeypatch, fake_tongyi):
+    fake_tongyi["response_text"] = "{}"
+    # Pin the character-based estimate so the expected cut is deterministic
+    monkeypatch.setattr(financial_llm, "_token_encoding", lambda: None)
+
+    llm.extract_structured_data("营" * 10_000)
+
+    user_prompt = fake_tongyi["calls"][0]["messages"][1]["content"]
+    assert "营" * financial_llm.EXTRACTION_TOKEN_LIMIT in user_prompt
+    assert "营" * (financial_llm.EXTRACTION_TOKEN_LIMIT + 1) not in user_prompt
+
+
+def test_run_all_issues_calls_concurrently(monkeypatch, fake_tongyi):
+    monkeypatch.setenv("TONGYI_API_KEY", "key")
+    llm = financial_llm.FinancialLLM(max_concurrent_requests=2)
+    barrier = threading.Barrier(2, timeout=5)
+
+    def complete(messages, **kwargs):
+        # Both calls must be in flight at once to get past the barrier
+        barrier.wait()
+        return "summary" if "Summarize" in messages[-1]["content"] else "insights"
+
+    monkeypatch.setattr(llm, "_complete", complete)
+
+    results = asyncio.run(
+        llm.run_all("Revenue 100", {"revenue": 100.0}, {"profit_margin": 10.0}, [])
+    )
+
+    assert results == {"summary": "summary", "insights": "insights"}
+
+
+def test_run_all_skips_unsupported_vision(llm, fake_tongyi):
+    fake_tongyi["response_text"] = "done"
+
+    results = asyncio.run(
+        llm.run_all("Revenue 100", {"revenue": 100.0}, {}, [], image_base64="aW1n")
+    )
+
+    assert results == {"summary": "done", "insights": "done"}
+    assert len(fake_tongyi["calls"]) == 2
+
+
+def test_run_all_raises_after_all_calls_finish(llm, fake_tongyi, monkeypatch):
+    finished = []
+
+    async def failing_summary(document_text):
+        raise RuntimeError("boom")
+
+    async def insights(*args):
+        await asyncio.sleep(0)
+        finished.append("insights")
+        return "insights"
+
+    monkeypatch.setattr(llm, "agenerate_summary", failing_summary)
+    monkeypatch.setattr(llm, "agenerate_financial_insights", insights)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(llm.run_all("Revenue 100", {}, {}, []))
+    assert finished == ["insights"]
+
+
+def test_async_variants_match_sync_results(llm, fake_tongyi):
+    fake_tongyi["response_text"] = '{"metrics": {"revenue": 5}}'
+
+    structured = asyncio.run(llm.aextract_structured_data("Revenue 5", period_hint="FY2023"))
+
+    assert structured["metrics"] == {"revenue": 5}
+    assert "Period hint: FY2023" in fake_tongyi["calls"][0]["messages"][1]["content"]
+
+
+def test_answer_question_keeps_prompt_prefix_stable(llm, fake_tongyi):
+    llm.answer_question(
+        "Q1?",
+        {"financial_data": {"revenue": 10, "net_income": 2}, "ratios": {"roe": 1.5, "current_ratio": 2.0}},
+        user_id="user-1",
+    )
+    llm.answer_question(
+        "Q2?",
+        {"financial_data": {"net_income": 2, "revenue": 10}, "ratios": {"current_ratio": 2.0, "roe": 1.5}},
+        user_id="user-1",
+    )
+
+    first, second = (call["messages"] for call in fake_tongyi["calls"])
+    assert second[: len(first) - 1] == first[:-1]
+    assert second[-1] == {"role": "user", "content": "Q2?"}
+
+
+def test_answer_questions_batches_into_one_call(llm, fake_tongyi):
+    fake_tongyi["response_text"] = json.dumps(
+        {"answers": [{"q": "Revenue?", "a": "100"}, {"q": "Margin?", "a": "12%"}]}
+    )
+    context = {"financial_data": {"revenue": 100}}
+
+    answers = llm.answer_questions(["Revenue?", "Margin?"], context, user_id="user-1")
+
+    assert answers == ["100", "12%"]
+    assert len(fake_tongyi["calls"]) == 1
+    prompt = fake_tongyi["calls"][0]["messages"][-1]["content"]
+    assert "1. Revenue?\n2. Margin?" in prompt
+    assert llm._get_history("user-1")[-2:] == [
+        {"role": "user", "content": "Margin?"},
+        {"role": "assistant", "content": "12%"},
+    ]
+
+
+def test_answer_questions_falls_back_to_numbered_text(llm, fake_tongyi):
+    fake_tongyi["response_text"] = "1. Revenue was 100.\n2) Margin was 12%."
+
+    answers = llm.answer_questions(["Revenue?", "Margin?", "Debt?"], {})
+
+    assert answers == ["Revenue was 100.", "Margin was 12%.", ""]
+
+
+def test_answer_questions_warns_on_unexpected_json_shape(llm, fake_tongyi, caplog):
+    fake_tongyi["response_text"] = json.dumps({"1": "Revenue was 100.", "2": "Margin was 12%."})
+
+    with caplog.at_level("WARNING", logger=financial_llm.__name__):
+        answers = llm.answer_questions(["Revenue?", "Margin?"], {})
+
+    assert answers == ["", ""]
+    assert "no 'answers' list" in caplog.text
+
+
+def test_answer_questions_single_question_uses_answer_question(llm, fake_tongyi):
+    fake_tongyi["response_text"] = "plain answer"
+
+    assert llm.answer_questions(["Revenue?"], {}) == ["plain answer"]
+    assert llm.answer_questions([], {}) == []
+    assert fake_tongyi["calls"][0]["messages"][-1] == {"role": "user", "content": "Revenue?"}
+
+
+def test_repeated_calls_are_served_from_response_cache(llm, fake_tongyi):
+    fake_tongyi["response_text"] = "summary"
+
+    assert llm.generate_summary("doc text") == "summary"
+    fake_tongyi["response_text"] = "fresh summary"
+    assert llm.generate_summary("doc text") == "summary"
+    assert len(fake_tongyi["calls"]) == 1
+
+    assert llm.generate_summary("doc text", use_cache=False) == "fresh summary"
+    assert llm.generate_summary("other text") == "fresh summary"
+    assert len(fake_tongyi["calls"]) == 3
+
+
+def test_reset_conversation_keeps_response_cache(llm, fake_tongyi):
+    llm.answer_question("Q?", {}, user_id="user-1")
+    llm.reset_conversation()
+    llm.answer_question("Q?", {}, user_id="user-1")
+
+    assert len(fake_tongyi["calls"]) == 1
+    assert len(llm.response_cache) == 1
+
+
+def test_client_streams_server_sent_events(monkeypatch):
+    posted = {}
+
+    class FakeStreamResponse:
+        status_code = 200
+        closed = False
+
+        def iter_lines(self):
+            yield b'data: {"choices": [{"delta": {"role": "assistant"}}]}'
+            yield b""
+            yield b'data: {"choices": [{"delta": {"content": "Revenue "}}]}'
+            yield b": keep-alive"
+            yield b'data: {"choices": [{"delta": {"content": "grew."}}]}'
+            yield b"data: [DONE]"
+            yield b'data: {"choices": [{"delta": {"content": "ignored"}}]}'
+
+        def close(self):
+            self.closed = True
+
+    response = FakeStreamResponse()
+
+    def fake_post(url, **kwargs):
+        posted.update(kwargs)
+        return response
+
+    client = financial_llm.TongyiClient(api_key="key")
+    monkeypatch.setattr(client.session, "post", fake_post)
+
+    chunks = list(client.stream_chat_completion(messages=[{"role": "user", "content": "Hi"}]))
+
+    assert chunks == ["Revenue ", "grew."]
+    assert posted["stream"] is True
+    assert json.loads(posted["data"])["stream"] is True
+    assert response.closed
+
+
+def test_answer_question_stream_updates_history_and_cache(llm, fake_tongyi):
+    fake_tongyi["stream_chunks"] = ["Net income ", "rose."]
+
+    chunks = list(llm.answer_question_stream("Q?", {}, user_id="user-1"))
+
+    assert chunks == ["Net income ", "rose."]
+    assert llm._get_history("user-1")[-1] == {"role": "assistant", "content": "Net income rose."}
+
+    # The same request is now answered from the cache, streamed or not
+    llm.reset_conversation()
+    assert list(llm.answer_question_stream("Q?", {}, user_id="user-1")) == ["Net income rose."]
+    llm.reset_conversation()
+    assert llm.answer_question("Q?", {}, user_id="user-1") == "Net income rose."
+    assert len(fake_tongyi["calls"]) == 1
+
+
+def test_summary_and_insights_stream(llm, fake_tongyi):
+    fake_tongyi["stream_chunks"] = ["a", "b"]
+
+    assert "".join(llm.generate_summary_stream("doc text")) == "ab"
+    assert "".join(llm.generate_financial_insights_stream({"revenue": 1.0}, {}, [])) == "ab"
+    assert "Summarize" in fake_tongyi["calls"][0]["messages"][-1]["content"]
+
+
+def test_generate_summary_truncates_by_tokens(llm, monkeypatch, fake_tongyi):
+    monkeypatch.setattr(financial_llm, "_token_encoding", lambda: None)
+    monkeypatch.setattr(financial_llm, "SUMMARY_TOKEN_LIMIT", 100)
+
+    # ASCII text gets about four characters per token, CJK text one
+    llm.generate_summary("a" * 1000)
+    llm.generate_summary("营" * 1000)
+
+    english, chinese = (call["messages"][-1]["content"] for call in fake_tongyi["calls"])
+    assert "a" * 400 in english and "a" * 401 not in english
+    assert "营" * 100 in chinese and "营" * 101 not in chinese